@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# batch_mapper.py
+"""
+Mapper por lotes: agrupa las líneas de producto de muchos documentos en
+arrays columnares (cantidad, precio, iva, descuento, importe) y calcula
+los importes derivados y el coste con NumPy, en lugar de hacerlo línea a
+línea como fetch_today.make_rows_from_doc.
+
+Las filas resultantes tienen la misma estructura de columnas que el mapper
+escalar. Para comparar ambos caminos con volumen de un mes:
+
+  python3 batch_mapper.py
+  python3 batch_mapper.py --memoria   # memoria de las filas con y sin diccionario de valores
+"""
+
+import sys, time
+from typing import Dict, Any, List, Tuple, Iterable
+
+import numpy as np
+
+from config import CSV_COLUMNS
+from fetch_today import (
+    CostHistory, iso_to_dt, pick_first_key, to_float, dt_to_ts, intern_text, fecha_jornada,
+)
+
+# ---------- Utils ----------
+def _num(x) -> float:
+    v = to_float(x)
+    return np.nan if v is None else v
+
+def _cells(arr: np.ndarray) -> List[Any]:
+    """Convierte un array float a celdas CSV: NaN -> "" y el resto a float de Python."""
+    return ["" if v != v else v for v in arr.tolist()]
+
+def _doc_header(doc, dt, tienda_id, tienda_info) -> Dict[str, Any]:
+    """Campos de cabecera comunes a todas las líneas de un documento."""
+    serie = pick_first_key(doc, "serie", "Serie")
+    numtiket = pick_first_key(doc, "num ket", "num tket", "numtiket", "num")
+    seccion = doc.get("seccion") or {}
+    servicio = doc.get("servicio") or {}
+    cliente  = doc.get("cliente")  or {}
+    totales  = doc.get("totales")  or {}
+
+    cab_total = to_float(totales.get("total"))
+    cab_base  = to_float(totales.get("baseImponible"))
+
+    fecha, jornada = fecha_jornada(dt)
+    fila = dict.fromkeys(CSV_COLUMNS, "")
+    fila.update({
+        "SERIE":serie or "", "NUMTIKET":numtiket or "",
+        "NUMBARRA":seccion.get("codigo") or "", "NNUMBARRA":intern_text(seccion.get("nombre") or ""),
+        "FECHA":fecha, "JORNADA":jornada,
+        "NUMCLIE":cliente.get("codigo") or "",
+        "SERVICIO":servicio.get("codigo") or "", "NSERVICIO":intern_text(servicio.get("nombre") or ""),
+        "CABIMPORTE":cab_total if cab_total is not None else "",
+        "CABNETO":cab_base if cab_base is not None else "",
+        "TIENDA":tienda_id, "ESTABLECIMIENTO":intern_text(tienda_info.get("nombre") or ""),
+        "NIFCLIENTE":cliente.get("nif") or "", "NOMBRECLIENTE":intern_text(cliente.get("nombre") or ""),
+    })
+    return fila
+
+# ---------- Coste vectorizado ----------
+def lookup_costes(tienda_col: List[int], ref_col: List[str], ts_col: np.ndarray,
+                  cost_index: Dict[int, CostHistory]) -> np.ndarray:
+    """
+    Coste unitario as-of por línea: el de la compra más reciente con fecha <=
+    la de la venta, o el de la primera compra si la venta es anterior (como
+    CostHistory.asof). Las líneas se agrupan por (tienda, referencia) y cada grupo
+    se resuelve con un único searchsorted sobre su historial.
+    """
+    n = len(ref_col)
+    coste = np.full(n, np.nan)
+    if n == 0:
+        return coste
+    keys = np.array([f"{t}|{r}" for t, r in zip(tienda_col, ref_col)])
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(uniq) + 1))
+
+    for i, key in enumerate(uniq.tolist()):
+        tid, ref = key.split("|", 1)
+        if not ref:
+            continue
+        hist = cost_index.get(int(tid))
+        hist = hist.history(ref) if hist is not None else None
+        if hist is None:
+            continue
+        times = np.frombuffer(hist[0], dtype=np.float64)
+        costs = np.frombuffer(hist[1], dtype=np.float64)
+        lines = order[bounds[i]:bounds[i + 1]]
+        pos = np.maximum(np.searchsorted(times, ts_col[lines], side="right") - 1, 0)
+        coste[lines] = costs[pos]
+    return np.round(coste, 6)
+
+# ---------- Mapper por lotes ----------
+def make_rows_from_docs(items: Iterable[Tuple[dict, int]],
+                        tiendas: Dict[int, Dict[str, str]],
+                        cost_index: Dict[int, CostHistory]) -> List[dict]:
+    """
+    Equivalente a llamar make_rows_from_doc para cada (doc, tienda_id) de items,
+    pero con los cálculos numéricos hechos en bloque.
+    """
+    headers: List[Dict[str, Any]] = []
+    header_ts: List[float] = []
+    line_header: List[int] = []
+    tienda_col: List[int] = []
+    ref_col: List[str] = []
+    desc_col: List[str] = []
+    grupo_col: List[str] = []
+    cantidad, precio, iva, descuento, importe = [], [], [], [], []
+
+    # 1) Recoger columnas
+    for doc, tid in items:
+        fecha_iso = pick_first_key(doc, "fecha", "Fecha", "FechaReg")
+        if not fecha_iso:
+            continue
+        productos = doc.get("productos") or []
+        if not productos:
+            continue
+        dt = iso_to_dt(fecha_iso)
+        h = len(headers)
+        headers.append(_doc_header(doc, dt, tid, tiendas.get(tid, {})))
+        header_ts.append(dt_to_ts(dt))
+        for p in productos:
+            ref = p.get("referencia")
+            line_header.append(h)
+            tienda_col.append(tid)
+            ref_col.append(intern_text(str(ref)) if ref not in (None, "") else "")
+            desc_col.append(intern_text(p.get("descripcion") or ""))
+            grupo_col.append(intern_text(p.get("grupo") or ""))
+            cantidad.append(_num(pick_first_key(p, "can tad", "cantidad")))
+            precio.append(_num(p.get("precio")))
+            iva.append(_num(p.get("iva")))
+            descuento.append(_num(p.get("descuento")))
+            importe.append(_num(p.get("importe")))
+
+    if not line_header:
+        return []
+
+    # 2) Cálculo vectorizado (NaN equivale al "" del mapper escalar)
+    a_cant = np.array(cantidad, dtype=np.float64)
+    a_prec = np.array(precio, dtype=np.float64)
+    a_iva  = np.array(iva, dtype=np.float64)
+    a_desc = np.array(descuento, dtype=np.float64)
+    a_imp  = np.array(importe, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = 1.0 + a_iva / 100.0
+        base = np.round(a_imp / factor, 6)
+        imp_desc = np.round(a_imp - a_desc, 6)
+        base_desc = np.round(imp_desc / factor, 6)
+
+    ts_col = np.array(header_ts, dtype=np.float64)[np.array(line_header)]
+    coste = lookup_costes(tienda_col, ref_col, ts_col, cost_index)
+
+    # 3) Emitir filas con el mismo layout que make_rows_from_doc
+    columnas = zip(
+        line_header, ref_col, desc_col, grupo_col,
+        _cells(a_cant), _cells(a_prec), _cells(a_iva), _cells(a_imp), _cells(base),
+        _cells(a_desc), _cells(imp_desc), _cells(base_desc), _cells(coste),
+    )
+    filas: List[dict] = []
+    for h, ref, desc, grupo, c, pr, iv, im, b, d, idc, bdc, co in columnas:
+        fila = headers[h].copy()
+        fila.update({
+            "NGRUPO":grupo, "PRODUCTO":ref, "NPRODUCTO":desc,
+            "CANTIDAD":c, "PRECIO":pr, "IVA":iv, "IMPORTE":im, "IMPORTESINIVA":b,
+            "DESCUENTO":d, "IMPORTEDESCUENTO":idc, "IMPORTESINIVADESCUENTO":bdc,
+            "COSTE":co,
+        })
+        filas.append(fila)
+    return filas
+
+# ---------- Benchmark ----------
+def _synthetic_month(n_docs: int, n_tiendas: int = 4, seed: int = 43):
+    """Documentos de venta y un índice de costes sintéticos con volumen de un mes."""
+    import random
+    from datetime import datetime, timedelta
+    rnd = random.Random(seed)
+    refs = [str(r) for r in range(100, 700)]
+    formatos = ["ración", "media ración", "tapa", "copa", "botella", "menú"]
+    grupos = ["Entrantes", "Carnes", "Pescados", "Postres", "Vinos", "Cervezas", "Refrescos", "Cafés"]
+    nombres = {r: f"Producto {r} {rnd.choice(formatos)}" for r in refs}
+    tiendas = {t: {"nombre": f"Tienda {t}"} for t in range(1, n_tiendas + 1)}
+    cost_index = {t: CostHistory() for t in tiendas}
+    for t, hist in cost_index.items():
+        for r in refs:
+            if rnd.random() < 0.7:
+                for day in sorted(rnd.sample(range(1, 29), 4)):
+                    hist.add(r, datetime(2025, 8, day, 8, 0), rnd.uniform(0.5, 30))
+    items = []
+    t0 = datetime(2025, 8, 1, 9, 0)
+    for i in range(n_docs):
+        tid = rnd.randint(1, n_tiendas)
+        productos = []
+        for _ in range(rnd.randint(1, 5)):
+            cant = rnd.choice([1.0, 1.0, 2.0, 3.0, -1.0])
+            precio = round(rnd.uniform(1, 60), 2)
+            ref = rnd.choice(refs)
+            productos.append({
+                "referencia": ref, "descripcion": nombres[ref], "grupo": grupos[int(ref) % len(grupos)],
+                "cantidad": cant, "precio": precio, "iva": rnd.choice([10.0, 21.0]),
+                "descuento": rnd.choice([0.0, 0.0, round(precio * 0.1, 2)]),
+                "importe": round(cant * precio, 2),
+            })
+        dt = t0 + timedelta(minutes=4 * i)
+        items.append(({
+            "fecha": dt.strftime("%Y-%m-%dT%H:%M:%S"), "serie": 5, "num": 1000 + i,
+            "seccion": {"codigo": 1 + i % 3, "nombre": f"Sala {1 + i % 3}"},
+            "servicio": {"codigo": 1 + dt.hour // 16, "nombre": "Cena" if dt.hour >= 16 else "Comida"},
+            "cliente": {"codigo": 1, "nif": "1234", "nombre": "cliente contado"},
+            "totales": {"total": 10.0, "baseImponible": 8.26},
+            "productos": productos,
+        }, tid))
+    return items, tiendas, cost_index
+
+def benchmark(n_docs: int = 10000):
+    from fetch_today import make_rows_from_doc
+
+    items, tiendas, cost_index = _synthetic_month(n_docs)
+
+    t = time.perf_counter()
+    scalar: List[dict] = []
+    for doc, tid in items:
+        scalar.extend(make_rows_from_doc(doc, tid, tiendas.get(tid, {}), cost_index[tid]))
+    t_scalar = time.perf_counter() - t
+
+    t = time.perf_counter()
+    batch = make_rows_from_docs(items, tiendas, cost_index)
+    t_batch = time.perf_counter() - t
+
+    assert len(scalar) == len(batch), (len(scalar), len(batch))
+    max_diff = 0.0
+    for a, b in zip(scalar, batch):
+        for col in CSV_COLUMNS:
+            va, vb = a[col], b[col]
+            if isinstance(va, float) and isinstance(vb, float):
+                max_diff = max(max_diff, abs(va - vb))
+            elif va != vb:
+                raise AssertionError(f"Columna {col}: {va!r} != {vb!r}")
+    assert max_diff < 1e-6, max_diff
+
+    print(f"Líneas: {len(batch):,}")
+    print(f"  Escalar: {t_scalar:.3f}s")
+    print(f"  Lotes:   {t_batch:.3f}s")
+    print(f"  Diferencia máxima: {max_diff:.2e}")
+
+def memory_benchmark(n_docs: int = 10000):
+    """
+    Memoria que retienen las filas de un mes sintético con y sin el diccionario
+    de valores (intern_text / fecha_jornada). Los documentos se decodifican de
+    JSON día a día, como llegan de la API, y se descartan tras mapearlos.
+    """
+    import json, tracemalloc
+    import fetch_today
+    from fetch_today import make_rows_from_doc, fmt_fecha, fmt_jornada, fecha_jornada
+
+    items, tiendas, cost_index = _synthetic_month(n_docs)
+    por_dia: Dict[str, List[Tuple[dict, int]]] = {}
+    for doc, tid in items:
+        por_dia.setdefault(doc["fecha"][:10], []).append((doc, tid))
+    payloads = [(json.dumps([d for d, _ in lote]), [t for _, t in lote]) for lote in por_dia.values()]
+
+    mappers = {
+        "Escalar": lambda lote: [f for doc, tid in lote
+                                 for f in make_rows_from_doc(doc, tid, tiendas[tid], cost_index[tid])],
+        "Lotes": lambda lote: make_rows_from_docs(lote, tiendas, cost_index),
+    }
+
+    def _run(mapper) -> Tuple[int, int, int]:
+        fecha_jornada.cache_clear()
+        tracemalloc.start()
+        rows: List[dict] = []
+        for payload, tids in payloads:
+            docs = json.loads(payload)
+            rows.extend(mapper(list(zip(docs, tids))))
+            del docs
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return len(rows), current, peak
+
+    def _run_sin_diccionario(mapper) -> Tuple[int, int, int]:
+        """Mismo mapper con un str nuevo por valor y línea (comportamiento anterior)."""
+        modulos = (fetch_today, sys.modules[__name__])
+        originales = [(m.intern_text, m.fecha_jornada) for m in modulos]
+        for m in modulos:
+            m.intern_text = lambda v: v
+            m.fecha_jornada = lambda dt: (fmt_fecha(dt), fmt_jornada(dt))
+        try:
+            return _run(mapper)
+        finally:
+            for m, (it, fj) in zip(modulos, originales):
+                m.intern_text, m.fecha_jornada = it, fj
+
+    print(f"Documentos: {n_docs:,} en {len(payloads)} días")
+    for nombre, mapper in mappers.items():
+        n, sin, sin_pico = _run_sin_diccionario(mapper)
+        _, con, con_pico = _run(mapper)
+        print(f"  {nombre:<8} {n:,} líneas · retenido {sin / 1e6:.1f} MB -> {con / 1e6:.1f} MB "
+              f"({(1 - con / sin) * 100:.0f}% menos) · pico {sin_pico / 1e6:.1f} MB -> {con_pico / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    if "--memoria" in sys.argv[1:]:
+        memory_benchmark()
+    else:
+        benchmark()
@@ -3,25 +3,43 @@
 #build_daily_today.py
 import os, shutil
 from datetime import date
-from config import TEMPLATE_XLSX, OUTPUT_DIR, TARGET_SHEET
+from config import TEMPLATE_XLSX, OUTPUT_DIR, TARGET_SHEET, SUMMARY_SHEETS, ROLLUPS
 from excel_writer import overwrite_non_formula_cells_with_csv
+from intermediates import find_ventas
 
-def main():
-    hoy = date.today()
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def build_daily(out_dir: str, dia: date, template: str = TEMPLATE_XLSX) -> str:
+    os.makedirs(out_dir, exist_ok=True)
 
-    in_csv = os.path.join(OUTPUT_DIR, f"ventas_{hoy.isoformat()}.csv")
+    in_csv = find_ventas(out_dir, dia)
     if not os.path.exists(in_csv):
         raise SystemExit(f"No existe el CSV de hoy: {in_csv}. Ejecuta primero fetch_today.py")
 
-    out_xlsx = os.path.join(OUTPUT_DIR, f"Daily_{hoy.isoformat()}.xlsx")
-    shutil.copy2(TEMPLATE_XLSX, out_xlsx)
+    out_xlsx = os.path.join(out_dir, f"Daily_{dia.isoformat()}.xlsx")
+    shutil.copy2(template, out_xlsx)
     print(f"Plantilla copiada a: {out_xlsx}")
 
+    # Resumen con valores ya calculados (no depende de que Excel recalcule),
+    # escrito en la misma carga/guardado del libro que BBDDcoste
+    before_save = None
+    if SUMMARY_SHEETS:
+        from daily_summary import LEVELS, load_csv_columns, summarize, add_summary_tables
+        tablas = None
+        if ROLLUPS:
+            from rollups import summary_tables
+            tablas = summary_tables(out_dir, dia.replace(day=1), dia)
+        if tablas is None:
+            data = load_csv_columns(in_csv)
+            tablas = {level: summarize(data, level) for level in LEVELS}
+        before_save = lambda wb: add_summary_tables(wb, tablas)
+
     # 🔑 Solo tocamos celdas SIN fórmula en BBDDcoste
-    overwrite_non_formula_cells_with_csv(out_xlsx, TARGET_SHEET, in_csv, backup=False)
+    overwrite_non_formula_cells_with_csv(out_xlsx, TARGET_SHEET, in_csv, backup=False, before_save=before_save)
 
     print(f"✅ Daily del día generado: {out_xlsx}")
+    return out_xlsx
+
+def main():
+    build_daily(OUTPUT_DIR, date.today())
 
 if __name__ == "__main__":
     main()
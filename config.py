@@ -22,6 +22,10 @@ USER = os.getenv("TOUCH_USER", "")
 PASSWORD = os.getenv("TOUCH_PASSWORD", "")
 TIMEOUT = int(os.getenv("TOUCH_TIMEOUT", "45"))
 
+# --- Varias cuentas (multi_company.py) ---
+TENANTS_FILE = os.getenv("DAILY_TENANTS", "tenants.json")
+MAX_CONCURRENT_REQUESTS = int(os.getenv("TOUCH_MAX_CONCURRENT", "4"))
+
 # --- Tiendas ---
 TIENDAS = _parse_tiendas(os.getenv("TOUCH_TIENDAS"))
 
@@ -29,6 +33,27 @@ TIENDAS = _parse_tiendas(os.getenv("TOUCH_TIENDAS"))
 TEMPLATE_XLSX = os.getenv("DAILY_TEMPLATE", "Daily plantilla 2025.xlsx")
 OUTPUT_DIR = os.getenv("DAILY_OUTPUT_DIR", ".")
 
+# --- Compresión de los ventas_*.csv intermedios: "", "gzip" o "zstd" (intermediates.py) ---
+CSV_COMPRESSION = os.getenv("DAILY_CSV_COMPRESSION", "").strip().lower()
+
+# --- Salida Parquet opcional (vacío = desactivada) ---
+PARQUET_DIR = os.getenv("DAILY_PARQUET_DIR", "")
+
+# --- Almacén SQLite opcional (vacío = desactivado) ---
+SQLITE_DB = os.getenv("DAILY_SQLITE_DB", "")
+
+# --- Servicio intradía (segundos entre consultas) ---
+INTRADAY_INTERVAL = int(os.getenv("DAILY_INTRADAY_INTERVAL", "300"))
+
+# --- Mapper por lotes (NumPy) ---
+BATCH_MAPPER = os.getenv("DAILY_BATCH_MAPPER", "").strip().lower() in ("1", "true", "si", "yes")
+
+# --- Hojas de resumen calculadas desde ventas (daily_summary.py) ---
+SUMMARY_SHEETS = os.getenv("DAILY_SUMMARY", "").strip().lower() in ("1", "true", "si", "yes")
+
+# --- Cubos pre-agregados tienda/día/grupo/producto en OUTPUT_DIR (rollups.py) ---
+ROLLUPS = os.getenv("DAILY_ROLLUPS", "").strip().lower() in ("1", "true", "si", "yes")
+
 # --- Hoja y cabecera destino en Excel ---
 TARGET_SHEET = "BBDDcoste"
 
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# daily.py
+"""
+Punto de entrada único del pipeline:
+
+  python3 daily.py fetch            # fetch_today.py
+  python3 daily.py build            # build_daily_today.py
+  python3 daily.py push [...]       # push_daily_to_sheets.py (mismos argumentos)
+  python3 daily.py upload [...]     # upload_daily_to_drive.py (mismos argumentos)
+  python3 daily.py run              # run_daily.py (fetch + build)
+  python3 daily.py imports          # arranque en frío por subcomando (sale con 1 si
+                                    # alguno importa una librería pesada no prevista)
+
+Cada subcomando importa su módulo solo cuando se ejecuta, y esos módulos
+difieren openpyxl / gspread / googleapiclient hasta que realmente los usan.
+"""
+
+import argparse, importlib, os, subprocess, sys, time
+
+SUBCOMMANDS = {
+    "fetch": ("fetch_today", "Descarga ventas del mes y genera ventas_YYYY-MM-DD.csv"),
+    "build": ("build_daily_today", "Copia la plantilla y escribe BBDDcoste"),
+    "push": ("push_daily_to_sheets", "Sube la hoja Daily a Google Sheets"),
+    "upload": ("upload_daily_to_drive", "Sube el Daily a Google Drive"),
+    "run": ("run_daily", "Pipeline diario completo (fetch + build)"),
+}
+# subcomandos con argparse propio: reciben el resto de la línea de comandos
+FORWARD_ARGS = {"push", "upload"}
+
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "gspread", "gspread_dataframe", "googleapiclient", "pyarrow")
+# librerías pesadas que cada subcomando puede cargar al importarse (el resto, ninguna);
+# openpyxl arrastra numpy si está instalado
+ALLOWED_HEAVY = {"build": ("openpyxl", "numpy")}
+
+def load(cmd: str):
+    """Importa el módulo del subcomando (sin ejecutarlo)."""
+    return importlib.import_module(SUBCOMMANDS[cmd][0])
+
+def check_imports() -> int:
+    """
+    Mide, en un intérprete nuevo por subcomando, lo que cuesta arrancar e
+    importar su módulo, y qué librerías pesadas arrastra. Devuelve 1 si algún
+    subcomando falla al importarse o carga una librería fuera de ALLOWED_HEAVY.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = (
+        "import sys, time; t = time.perf_counter(); import daily; daily.load(sys.argv[1]); "
+        "dt = time.perf_counter() - t; "
+        f"print(round(dt * 1000, 1), ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    fallos = 0
+    print(f"{'subcomando':<10} {'import ms':>10}  {'total ms':>9}  librerías pesadas")
+    for cmd in SUBCOMMANDS:
+        t = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", probe, cmd], cwd=here,
+                             capture_output=True, text=True)
+        total = (time.perf_counter() - t) * 1000
+        if out.returncode != 0:
+            fallos += 1
+            print(f"{cmd:<10} {'error':>10}  {total:>9.1f}  {out.stderr.strip().splitlines()[-1]}")
+            continue
+        ms, _, heavy = out.stdout.strip().partition(" ")
+        sobran = [m for m in heavy.split(",") if m and m not in ALLOWED_HEAVY.get(cmd, ())]
+        aviso = f"  ❌ no previstas: {','.join(sobran)}" if sobran else ""
+        fallos += bool(sobran)
+        print(f"{cmd:<10} {ms:>10}  {total:>9.1f}  {heavy or '-'}{aviso}")
+    return 1 if fallos else 0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pipeline Daily: descarga, Excel, Sheets y Drive.")
+    sub = ap.add_subparsers(dest="cmd", required=True, metavar="subcomando")
+    for cmd, (_, help_text) in SUBCOMMANDS.items():
+        if cmd in FORWARD_ARGS:
+            sub.add_parser(cmd, help=help_text, add_help=False)
+        else:
+            sub.add_parser(cmd, help=help_text, description=help_text)
+    sub.add_parser("imports", help="Tiempo de arranque en frío por subcomando")
+    args, extra = ap.parse_known_args(argv)
+    if extra and args.cmd not in FORWARD_ARGS:
+        ap.error(f"argumentos no reconocidos: {' '.join(extra)}")
+
+    if args.cmd == "imports":
+        sys.exit(check_imports())
+
+    module = load(args.cmd)
+    if args.cmd in FORWARD_ARGS:
+        sys.argv = [f"{SUBCOMMANDS[args.cmd][0]}.py", *extra]
+    module.main()
+
+if __name__ == "__main__":
+    main()
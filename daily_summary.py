@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# daily_summary.py
+"""
+Resumen del Daily calculado directamente desde las filas de ventas, sin
+depender de que Excel recalcule las fórmulas de la plantilla.
+
+Métricas por nivel (tienda/día, tienda/día/grupo, tienda/día/producto):
+  CANTIDAD, VENTAS (IMPORTE), DESCUENTO, NETO (IMPORTESINIVADESCUENTO),
+  COSTE (COSTE unitario x CANTIDAD), MARGEN (NETO - COSTE), MARGEN %,
+  LINEAS y LINEAS SIN COSTE.
+
+Las agregaciones son group-bys vectorizados con NumPy (np.unique + bincount).
+
+  python3 daily_summary.py ventas_2025-08-20.csv                 # imprime el resumen por tienda/día
+  python3 daily_summary.py ventas_2025-08-20.csv --xlsx Daily_2025-08-20.xlsx
+"""
+
+import argparse, csv, sys, time
+from datetime import date
+from typing import Dict, Any, List, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from excel_writer import DATE_COL, safe_float, parse_d
+from intermediates import open_text
+
+# Niveles de agregación: nombre -> (columnas clave, columnas descriptivas)
+LEVELS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "dia": (("TIENDA", DATE_COL), ("ESTABLECIMIENTO",)),
+    "grupo": (("TIENDA", DATE_COL, "NGRUPO"), ("ESTABLECIMIENTO",)),
+    "producto": (("TIENDA", DATE_COL, "PRODUCTO"), ("ESTABLECIMIENTO", "NGRUPO", "NPRODUCTO")),
+}
+SUMMARY_SHEETS = {"dia": "Resumen dia", "grupo": "Resumen grupo", "producto": "Resumen producto"}
+
+KEY_COLUMNS = ("TIENDA", "ESTABLECIMIENTO", DATE_COL, "NGRUPO", "PRODUCTO", "NPRODUCTO")
+VALUE_COLUMNS = ("CANTIDAD", "IMPORTE", "IMPORTESINIVA", "DESCUENTO", "IMPORTESINIVADESCUENTO", "COSTE")
+METRICS = ["CANTIDAD", "VENTAS", "DESCUENTO", "NETO", "COSTE", "MARGEN", "MARGEN %", "LINEAS", "LINEAS SIN COSTE"]
+# Medidas sumables por grupo (también las columnas de los cubos de rollups.py)
+MEASURES = ["CANTIDAD", "IMPORTE", "IMPORTESINIVA", "DESCUENTO", "IMPORTESINIVADESCUENTO",
+            "COSTE", "LINEAS", "LINEAS_SIN_COSTE"]
+
+# ---------- Carga columnar ----------
+class VentasColumns:
+    """Columnas de ventas: claves como arrays de texto, importes como float64 (NaN = vacío)."""
+    def __init__(self, keys: Dict[str, List[str]], values: Dict[str, List[float]]):
+        self.keys = {c: np.asarray(v, dtype=object) for c, v in keys.items()}
+        self.values = {c: np.asarray(v, dtype=np.float64) for c, v in values.items()}
+        self.n = len(next(iter(self.values.values()))) if self.values else 0
+
+def _num(v) -> float:
+    if isinstance(v, float):
+        return v
+    f = safe_float(v)
+    return np.nan if f is None else f
+
+def columns_from_rows(rows: Iterable[Dict[str, Any]]) -> VentasColumns:
+    """Desde filas de make_rows_from_doc (o csv.DictReader)."""
+    keys: Dict[str, List[str]] = {c: [] for c in KEY_COLUMNS}
+    values: Dict[str, List[float]] = {c: [] for c in VALUE_COLUMNS}
+    for r in rows:
+        for c in KEY_COLUMNS:
+            keys[c].append(str(r.get(c, "") or ""))
+        for c in VALUE_COLUMNS:
+            values[c].append(_num(r.get(c, "")))
+    return VentasColumns(keys, values)
+
+def load_csv_columns(csv_path: str) -> VentasColumns:
+    """Lee del CSV solo las columnas necesarias, fila a fila."""
+    with open_text(csv_path) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        kidx = [(c, header.index(c)) for c in KEY_COLUMNS if c in header]
+        vidx = [(c, header.index(c)) for c in VALUE_COLUMNS if c in header]
+        keys: Dict[str, List[str]] = {c: [] for c in KEY_COLUMNS}
+        values: Dict[str, List[float]] = {c: [] for c in VALUE_COLUMNS}
+        n = 0
+        for row in reader:
+            for c, i in kidx:
+                keys[c].append(sys.intern(row[i]) if i < len(row) else "")
+            for c, i in vidx:
+                values[c].append(_num(row[i]) if i < len(row) else np.nan)
+            n += 1
+    for c in KEY_COLUMNS:
+        if not keys[c]:
+            keys[c] = [""] * n
+    for c in VALUE_COLUMNS:
+        if not values[c]:
+            values[c] = [np.nan] * n
+    return VentasColumns(keys, values)
+
+# ---------- Group-by ----------
+def _sort_key(col: str):
+    if col == "TIENDA":
+        return lambda v: (safe_float(v) is None, safe_float(v) or 0.0, v)
+    if col == DATE_COL:
+        return lambda v: (parse_d(v) is None, parse_d(v) or date.min, v)
+    return lambda v: v
+
+def _codes(col: str, arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Códigos enteros por valor, ordenados de forma natural (tienda numérica, fecha real)."""
+    uniq, inverse = np.unique(arr.astype(str), return_inverse=True)
+    order = sorted(range(len(uniq)), key=lambda i: _sort_key(col)(uniq[i]))
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[order] = np.arange(len(uniq))
+    return uniq[order], rank[inverse]
+
+def group_index(data: VentasColumns, by: Sequence[str], extra: Sequence[str] = ()) -> Tuple[List[List[Any]], np.ndarray, int]:
+    """
+    Índice de grupos por las columnas `by`. Devuelve (claves, inverse, nº grupos):
+    claves es una lista de filas [by..., extra...] (extra = primer valor del grupo)
+    e inverse el grupo de cada línea, listo para np.bincount.
+    """
+    key = np.zeros(data.n, dtype=np.int64)
+    uniques = []
+    for col in by:
+        uniq, codes = _codes(col, data.keys[col])
+        key = key * len(uniq) + codes
+        uniques.append(uniq)
+    groups, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    ng = len(groups)
+
+    # Desempaquetar la clave compuesta (radix mixto) en sus columnas
+    claves: List[List[Any]] = [[] for _ in range(ng)]
+    rest = groups.copy()
+    cols_codes = []
+    for uniq in reversed(uniques):
+        cols_codes.append(rest % len(uniq))
+        rest //= len(uniq)
+    cols_codes.reverse()
+    for uniq, codes in zip(uniques, cols_codes):
+        vals = uniq[codes].tolist()
+        for g in range(ng):
+            claves[g].append(vals[g])
+    for col in extra:
+        vals = data.keys[col][first].tolist()
+        for g in range(ng):
+            claves[g].append(vals[g])
+    return claves, inverse, ng
+
+def group_sum(data: VentasColumns, by: Sequence[str], extra: Sequence[str] = ()) -> Tuple[List[List[Any]], Dict[str, np.ndarray]]:
+    """
+    Agrupa por las columnas `by` y suma las métricas. Devuelve (claves, métricas),
+    con las métricas como arrays alineados con las claves.
+    """
+    if data.n == 0:
+        return [], {m: np.empty(0) for m in METRICS}
+    claves, inverse, ng = group_index(data, by, extra)
+    return claves, metrics_from_measures(group_measures(data, inverse, ng))
+
+def group_measures(data: VentasColumns, inverse: np.ndarray, ng: int) -> Dict[str, np.ndarray]:
+    """
+    MEASURES sumadas por grupo (inverse/ng de group_index). COSTE es coste
+    unitario x CANTIDAD de las líneas con coste; las demás cuentan en LINEAS_SIN_COSTE.
+    """
+    def _sum(arr: np.ndarray) -> np.ndarray:
+        return np.bincount(inverse, weights=np.nan_to_num(arr), minlength=ng)
+
+    v = data.values
+    cantidad = np.nan_to_num(v["CANTIDAD"])
+    has_cost = ~np.isnan(v["COSTE"])
+    return {
+        "CANTIDAD": _sum(cantidad),
+        "IMPORTE": _sum(v["IMPORTE"]),
+        "IMPORTESINIVA": _sum(v["IMPORTESINIVA"]),
+        "DESCUENTO": _sum(v["DESCUENTO"]),
+        "IMPORTESINIVADESCUENTO": _sum(v["IMPORTESINIVADESCUENTO"]),
+        "COSTE": _sum(np.where(has_cost, v["COSTE"] * cantidad, 0.0)),
+        "LINEAS": np.bincount(inverse, minlength=ng).astype(np.float64),
+        "LINEAS_SIN_COSTE": np.bincount(inverse, weights=(~has_cost).astype(np.float64), minlength=ng),
+    }
+
+def metrics_from_measures(m: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """METRICS de los informes a partir de las MEASURES sumadas."""
+    metrics = {
+        "CANTIDAD": m["CANTIDAD"],
+        "VENTAS": m["IMPORTE"],
+        "DESCUENTO": m["DESCUENTO"],
+        "NETO": m["IMPORTESINIVADESCUENTO"],
+        "COSTE": m["COSTE"],
+        "LINEAS": m["LINEAS"],
+        "LINEAS SIN COSTE": m["LINEAS_SIN_COSTE"],
+    }
+    add_margins(metrics)
+    return metrics
+
+def add_margins(metrics: Dict[str, np.ndarray]):
+    """MARGEN y MARGEN % a partir de NETO y COSTE."""
+    metrics["MARGEN"] = metrics["NETO"] - metrics["COSTE"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics["MARGEN %"] = np.where(metrics["NETO"] != 0, metrics["MARGEN"] / metrics["NETO"] * 100.0, np.nan)
+
+def summarize(data: VentasColumns, level: str = "dia") -> List[List[Any]]:
+    """Tabla (cabecera + filas) del nivel pedido, lista para Excel o Sheets."""
+    by, extra = LEVELS[level]
+    claves, metrics = group_sum(data, by, extra)
+    return build_table(list(by) + list(extra), claves, metrics)
+
+def build_table(key_header: List[str], claves: List[List[Any]], metrics: Dict[str, np.ndarray]) -> List[List[Any]]:
+    tabla: List[List[Any]] = [key_header + METRICS]
+    cols = [np.round(metrics[m], 6).tolist() for m in METRICS]
+    for g, k in enumerate(claves):
+        vals = []
+        for m, col in zip(METRICS, cols):
+            x = col[g]
+            vals.append("" if x != x else (int(x) if m in ("LINEAS", "LINEAS SIN COSTE") else x))
+        tabla.append(list(k) + vals)
+    return tabla
+
+# ---------- Escritura en el libro ----------
+def write_summary_sheets(xlsx_path: str, data: VentasColumns, levels: Sequence[str] = tuple(LEVELS)) -> None:
+    """Escribe (o reemplaza) una hoja de valores por nivel en el libro."""
+    write_summary_tables(xlsx_path, {level: summarize(data, level) for level in levels})
+
+def write_summary_tables(xlsx_path: str, tablas: Dict[str, List[List[Any]]]) -> None:
+    from openpyxl import load_workbook
+    print(f"🧮 Escribiendo resumen en {xlsx_path}…")
+    start_time = time.time()
+    wb = load_workbook(xlsx_path)
+    add_summary_tables(wb, tablas)
+    wb.save(xlsx_path)
+    print(f"✅ Resumen escrito en {time.time() - start_time:.2f}s")
+
+def add_summary_tables(wb, tablas: Dict[str, List[List[Any]]]) -> None:
+    """Escribe (o reemplaza) las hojas de resumen en un libro ya abierto, sin guardarlo."""
+    for level, tabla in tablas.items():
+        name = SUMMARY_SHEETS[level]
+        if name in wb.sheetnames:
+            del wb[name]
+        ws = wb.create_sheet(name)
+        fecha_idx, tienda_idx = tabla[0].index(DATE_COL), tabla[0].index("TIENDA")
+        for i, row in enumerate(tabla):
+            if i:
+                row = list(row)
+                row[fecha_idx] = parse_d(row[fecha_idx]) or row[fecha_idx]
+                tienda = safe_float(row[tienda_idx])
+                row[tienda_idx] = int(tienda) if tienda is not None else row[tienda_idx]
+            ws.append(row)
+        for (cell,) in ws.iter_rows(min_row=2, min_col=fecha_idx + 1, max_col=fecha_idx + 1):
+            cell.number_format = "dd/mm/yyyy"
+        print(f"  📄 {name}: {len(tabla) - 1} filas")
+
+def main():
+    ap = argparse.ArgumentParser(description="Resumen del Daily calculado desde ventas_*.csv.")
+    ap.add_argument("csv", help="CSV de ventas (layout de fetch_today)")
+    ap.add_argument("--nivel", choices=list(LEVELS), default="dia")
+    ap.add_argument("--xlsx", help="Escribe las hojas de resumen en este XLSX")
+    args = ap.parse_args()
+
+    start_time = time.time()
+    data = load_csv_columns(args.csv)
+    print(f"📁 {data.n} líneas cargadas en {time.time() - start_time:.2f}s", file=sys.stderr)
+
+    if args.xlsx:
+        write_summary_sheets(args.xlsx, data)
+        return
+
+    tabla = summarize(data, args.nivel)
+    csv.writer(sys.stdout).writerows(tabla)
+
+if __name__ == "__main__":
+    main()
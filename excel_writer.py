@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 # excel_writer.py
 
-import csv, os, shutil, time
+import csv, os, shutil, sys, time
 from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from itertools import chain
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
 
 from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, range_boundaries
 from openpyxl.cell.cell import MergedCell
 
+from intermediates import open_text
+
 # --- Config de tipado por nombre de columna ---
 DATETIME_COL = "FECHA"
 DATE_COL = "JORNADA"
@@ -28,6 +32,10 @@ TEXT_FORCE_COLUMNS = {
     "CTACONTABLE","CECO","NIFCLIENTE","NOMBRECLIENTE","VENCIMIENTO","PROMOCION",
     "OBSERVACIONES","Turno","Denominacion 2","Factura","Motivo"
 }
+# Nombres que se repiten en casi todas las filas: se internan al volcar a Excel
+INTERN_COLUMNS = {
+    "ESTABLECIMIENTO","NNUMBARRA","NSERVICIO","NGRUPO","NPRODUCTO","NOMBRECLIENTE",
+}
 
 # ------------------------ Utilidades de parseo ------------------------
 
@@ -73,17 +81,6 @@ def parse_d(s: str) -> Optional[date]:
     except Exception:
         return None
 
-def load_csv_rows(csv_path: str, encoding="utf-8") -> List[Dict[str, Any]]:
-    print(f"📁 Cargando CSV: {csv_path}")
-    start_time = time.time()
-    
-    with open(csv_path, newline="", encoding=encoding) as f:
-        rows = list(csv.DictReader(f))
-    
-    elapsed = time.time() - start_time
-    print(f"✅ CSV cargado: {len(rows)} filas en {elapsed:.2f}s")
-    return rows
-
 def read_header(ws) -> List[str]:
     return [
         (cell.value or "").strip() if isinstance(cell.value, str) else (cell.value or "")
@@ -108,6 +105,99 @@ def coerce_value(col: str, val: Any):
         return num if num is not None else ("" if val == "" else str(val))
     return val
 
+# ------------------------ Carga tipada en streaming ------------------------
+
+CHUNK_ROWS = 1000
+
+def _is_none_str(v: str) -> bool:
+    return v.strip().lower() == "none"
+
+@lru_cache(maxsize=65536)
+def _parse_dt_cached(s: str) -> Optional[datetime]:
+    return parse_dt(s)
+
+@lru_cache(maxsize=4096)
+def _parse_d_cached(s: str) -> Optional[date]:
+    return parse_d(s)
+
+def _as_text(v: str):
+    return "" if _is_none_str(v) else v
+
+def _as_name(v: str):
+    # internado: cada nombre distinto comparte un único str en todas sus celdas
+    return "" if _is_none_str(v) else sys.intern(v)
+
+def _as_datetime(v: str):
+    if _is_none_str(v):
+        return ""
+    return _parse_dt_cached(v) or v
+
+def _as_date(v: str):
+    if _is_none_str(v):
+        return ""
+    return _parse_d_cached(v) or v
+
+def _as_number(v: str):
+    try:
+        num = float(v)  # camino rápido: el CSV de fetch_today escribe floats de Python
+        if num == num:
+            return num
+    except ValueError:
+        pass
+    num = safe_float(v)
+    if num is not None:
+        return num
+    return "" if v == "" or _is_none_str(v) else v
+
+def coercer_for(col: str) -> Callable[[str], Any]:
+    """Conversión de un valor de texto del CSV para la columna col (mismas reglas que coerce_value)."""
+    if col in INTERN_COLUMNS:
+        return _as_name
+    if col in TEXT_FORCE_COLUMNS:
+        return _as_text
+    if col == DATETIME_COL:
+        return _as_datetime
+    if col == DATE_COL:
+        return _as_date
+    if col in NUMERIC_COLUMNS:
+        return _as_number
+    return _as_text
+
+def coercion_plan(columns: List[str]) -> List[Callable[[str], Any]]:
+    """Una función de conversión por columna, resuelta una sola vez desde la cabecera."""
+    return [coercer_for(c) for c in columns]
+
+def read_csv_header(csv_path: str, encoding="utf-8") -> List[str]:
+    with open_text(csv_path, encoding=encoding) as f:
+        return next(csv.reader(f), [])
+
+def iter_typed_rows(csv_path: str, columns: List[str], chunk_rows: int = CHUNK_ROWS,
+                    encoding="utf-8") -> Iterator[List[List[Any]]]:
+    """
+    Lee el CSV con csv.reader y devuelve bloques de hasta chunk_rows filas ya
+    tipadas, con los valores en el orden de `columns`. Las filas cortas se
+    completan con "" (como DictReader + coerce_value).
+    """
+    with open_text(csv_path, encoding=encoding) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise SystemExit(f"Columnas no presentes en {csv_path}: {', '.join(missing)}")
+        pairs = list(zip(coercion_plan(columns), [header.index(c) for c in columns]))
+
+        chunk: List[List[Any]] = []
+        for row in reader:
+            try:
+                chunk.append([fn(row[i]) for fn, i in pairs])
+            except IndexError:
+                chunk.append([fn(row[i]) if i < len(row) else "" for fn, i in pairs])
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
 # ------------------------ Helpers de Excel ------------------------
 
 def cell_has_formula(cell) -> bool:
@@ -116,11 +206,6 @@ def cell_has_formula(cell) -> bool:
 def cell_is_merged(cell) -> bool:
     return isinstance(cell, MergedCell)
 
-def ensure_row_exists(ws, row_idx: int):
-    """Asegura que la fila row_idx existe; si no, agrega filas hasta alcanzarla."""
-    while ws.max_row < row_idx:
-        ws.append([])
-
 # ------------------------ Análisis previo para optimización ------------------------
 
 def analyze_sheet_structure(ws, csv_cols, header):
@@ -166,62 +251,95 @@ def analyze_sheet_structure(ws, csv_cols, header):
 
 # ------------------------ Escritura optimizada ------------------------
 
-def write_data_optimized(ws, rows, col_indices, formula_cells, merged_cells):
+def write_data_optimized(ws, chunks: Iterable[List[List[Any]]], col_indices, formula_cells, merged_cells) -> int:
     """
-    Escribe los datos de manera optimizada, evitando verificaciones innecesarias
+    Escribe bloques de filas ya tipadas (iter_typed_rows, valores en el orden
+    de col_indices) desde la fila 2. Devuelve el número de filas escritas.
     """
-    print(f"✍️  Escribiendo {len(rows)} filas de datos...")
+    print(f"✍️  Escribiendo filas de datos...")
     start_time = time.time()
     
-    first_data_row = 2
-    last_progress = 0
+    cidxs = list(col_indices.values())
+    protected = formula_cells | merged_cells
+    r = 2
+    n = 0
     
-    for i, record in enumerate(rows):
-        r = first_data_row + i
-        ensure_row_exists(ws, r)
-        
-        # Progreso cada 1000 filas
-        if i > 0 and i % 1000 == 0:
-            elapsed = time.time() - start_time
-            progress = (i / len(rows)) * 100
-            speed = i / elapsed if elapsed > 0 else 0
-            eta = (len(rows) - i) / speed if speed > 0 else 0
-            print(f"  📝 Progreso: {progress:.1f}% ({i:,}/{len(rows):,}) - {speed:.0f} filas/s - ETA: {eta:.1f}s")
+    for chunk in chunks:
+        for values in chunk:
+            for cidx, value in zip(cidxs, values):
+                # Verificación optimizada: solo verificar si está en los sets precalculados
+                if (r, cidx) in protected:
+                    continue
+                ws.cell(row=r, column=cidx, value=value)
+            r += 1
+        n += len(chunk)
         
-        for col_name, cidx in col_indices.items():
-            # Verificación optimizada: solo verificar si está en los sets precalculados
-            if (r, cidx) in formula_cells or (r, cidx) in merged_cells:
-                continue
-            
-            cell = ws.cell(row=r, column=cidx)
-            cell.value = coerce_value(col_name, record.get(col_name, ""))
+        # Progreso cada bloque
+        elapsed = time.time() - start_time
+        speed = n / elapsed if elapsed > 0 else 0
+        print(f"  📝 Progreso: {n:,} filas - {speed:.0f} filas/s")
     
     elapsed = time.time() - start_time
-    speed = len(rows) / elapsed if elapsed > 0 else 0
+    speed = n / elapsed if elapsed > 0 else 0
     print(f"✅ Datos escritos en {elapsed:.2f}s ({speed:.0f} filas/s)")
+    return n
 
 def clean_old_data_optimized(ws, last_new_row, col_indices, formula_cells, merged_cells):
     """
-    Limpia datos antiguos de manera optimizada
+    Trunca los datos antiguos por debajo de last_new_row: en vez de escribir ""
+    celda a celda, elimina de una pasada las celdas de las columnas de datos
+    (salvo fórmulas y merged), y con ellas las filas que quedan vacías. Así la
+    dimensión de la hoja, el tamaño del fichero y el rango que recalcula Excel
+    siguen al volumen real de datos.
     """
     last_row = ws.max_row
     if last_row <= last_new_row:
         return
     
     rows_to_clean = last_row - last_new_row
-    print(f"🧹 Limpiando {rows_to_clean} filas antiguas...")
+    print(f"🧹 Truncando {rows_to_clean} filas antiguas...")
     start_time = time.time()
     
-    cleaned_count = 0
+    cells = ws._cells
+    data_cols = list(col_indices.values())
+    protected = formula_cells | merged_cells
+    removed_count = 0
     for r in range(last_new_row + 1, last_row + 1):
-        for col_name, cidx in col_indices.items():
-            if (r, cidx) not in formula_cells and (r, cidx) not in merged_cells:
-                cell = ws.cell(row=r, column=cidx)
-                cell.value = ""
-                cleaned_count += 1
+        for cidx in data_cols:
+            cell = cells.get((r, cidx))
+            if cell is None or (r, cidx) in protected:
+                continue
+            # analyze_sheet_structure solo mira las 10000 primeras filas: se comprueba la celda
+            if cell_has_formula(cell) or cell_is_merged(cell):
+                continue
+            del cells[(r, cidx)]
+            removed_count += 1
+    kept_rows = {r for r, _ in cells if r > last_new_row}
+    
+    # Alto/estilo de las filas que han quedado vacías
+    for r in [r for r in ws.row_dimensions if r > last_new_row and r not in kept_rows]:
+        del ws.row_dimensions[r]
+    
+    shrink_sheet_ranges(ws, ws.max_row)
     
     elapsed = time.time() - start_time
-    print(f"✅ Limpieza completada en {elapsed:.2f}s ({cleaned_count} celdas limpiadas)")
+    print(f"✅ Truncado en {elapsed:.2f}s ({removed_count} celdas eliminadas, "
+          f"{len(kept_rows)} filas con fórmulas/merged conservadas, rango {ws.dimensions})")
+
+def shrink_sheet_ranges(ws, last_row: int):
+    """Ajusta autofiltro y tablas de la hoja para que no pasen de last_row."""
+    def _shrink(ref: str) -> str:
+        min_col, min_row, max_col, max_row = range_boundaries(ref)
+        if max_row <= last_row:
+            return ref
+        return f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max(last_row, min_row + 1)}"
+    
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = _shrink(ws.auto_filter.ref)
+    for table in ws.tables.values():
+        table.ref = _shrink(table.ref)
+        if table.autoFilter is not None and table.autoFilter.ref:
+            table.autoFilter.ref = table.ref
 
 def apply_date_formatting(ws, header, first_data_row, last_new_row):
     """
@@ -261,11 +379,56 @@ def apply_date_formatting(ws, header, first_data_row, last_new_row):
     elapsed = time.time() - start_time
     print(f"✅ Formatos aplicados en {elapsed:.2f}s ({formatted_count} celdas)")
 
+# ------------------------ Anexado incremental ------------------------
+
+def last_data_row(ws, col_idx: int) -> int:
+    """Última fila con valor en la columna col_idx (1 si solo hay cabecera)."""
+    cells = ws._cells  # ws.cell() crearía una celda vacía por cada fila revisada
+    for r in range(ws.max_row, 1, -1):
+        cell = cells.get((r, col_idx))
+        if cell is not None and cell.value not in (None, ""):
+            return r
+    return 1
+
+def append_rows_to_sheet(xlsx_path: str, sheet_name: str, rows: List[Dict[str, Any]]) -> int:
+    """
+    Añade filas nuevas a continuación de los datos existentes de la hoja,
+    sin reescribir las anteriores. Respeta celdas con fórmula y merged.
+    """
+    if not rows:
+        return 0
+    wb = load_workbook(xlsx_path, data_only=False)
+    if sheet_name not in wb.sheetnames:
+        raise SystemExit(f"No existe la hoja '{sheet_name}'")
+    ws = wb[sheet_name]
+
+    header = [str(h) for h in read_header(ws)]
+    col_indices = {name: header.index(name) + 1 for name in rows[0].keys() if name in header}
+    if not col_indices:
+        return 0
+    key_idx = col_indices.get(DATE_COL) or next(iter(col_indices.values()))
+
+    first = last_data_row(ws, key_idx) + 1
+    for i, record in enumerate(rows):
+        r = first + i
+        for col_name, cidx in col_indices.items():
+            cell = ws.cell(row=r, column=cidx)
+            if cell_has_formula(cell) or cell_is_merged(cell):
+                continue
+            cell.value = coerce_value(col_name, record.get(col_name, ""))
+
+    apply_date_formatting(ws, header, first, first + len(rows) - 1)
+    wb.save(xlsx_path)
+    return len(rows)
+
 # ------------------------ Función principal optimizada ------------------------
 
-def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_path: str, backup=True):
+def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_path: str, backup=True,
+                                         before_save: Optional[Callable[[Any], None]] = None):
     """
-    Versión optimizada con logs detallados y análisis previo
+    Versión optimizada con logs detallados y análisis previo.
+    before_save(wb), si se indica, se llama con el libro abierto justo antes de
+    guardarlo (p.ej. para escribir otras hojas en la misma carga/guardado).
     """
     print(f"\n🚀 INICIANDO PROCESO DE ESCRITURA EXCEL")
     print(f"📄 Archivo: {xlsx_path}")
@@ -285,8 +448,8 @@ def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_pa
         backup_time = time.time() - backup_start
         print(f"✅ Backup creado en {backup_time:.2f}s: {bk}")
 
-    # 0) Cargar datos CSV
-    rows = load_csv_rows(csv_path)
+    # 0) Cabecera del CSV (las filas se leen en streaming al escribir)
+    csv_header = read_csv_header(csv_path)
 
     # 1) Abrir libro y hoja
     print(f"📖 Abriendo archivo Excel...")
@@ -305,12 +468,13 @@ def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_pa
     print(f"📋 Cabeceras encontradas: {len(header)}")
 
     # 3) Columnas a escribir
-    if rows:
-        csv_cols = [c for c in rows[0].keys() if c in header]
-    else:
-        csv_cols = []
+    csv_cols = [c for c in csv_header if c in header]
+    chunks = iter_typed_rows(csv_path, csv_cols) if csv_cols else iter(())
+    first_chunk = next(chunks, None)
     
-    if not csv_cols:
+    if first_chunk is None:
+        if before_save is not None:
+            before_save(wb)
         wb.save(xlsx_path)
         print("❌ No hay columnas válidas en el CSV. No se realizaron cambios.")
         return
@@ -322,17 +486,18 @@ def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_pa
     formula_cells, merged_cells, col_indices = analyze_sheet_structure(ws, csv_cols, header)
 
     # 5) Escritura optimizada
-    write_data_optimized(ws, rows, col_indices, formula_cells, merged_cells)
+    n_rows = write_data_optimized(ws, chain([first_chunk], chunks), col_indices, formula_cells, merged_cells)
 
     # 6) Limpieza optimizada
-    last_new_row = 2 + len(rows) - 1 if rows else 1
+    last_new_row = 2 + n_rows - 1
     clean_old_data_optimized(ws, last_new_row, col_indices, formula_cells, merged_cells)
 
     # 7) Formatos de fecha
-    if rows:
-        apply_date_formatting(ws, header, 2, last_new_row)
+    apply_date_formatting(ws, header, 2, last_new_row)
 
-    # 8) Guardar
+    # 8) Otras hojas y guardar
+    if before_save is not None:
+        before_save(wb)
     print(f"💾 Guardando archivo...")
     save_start = time.time()
     wb.save(xlsx_path)
@@ -344,8 +509,8 @@ def overwrite_non_formula_cells_with_csv(xlsx_path: str, sheet_name: str, csv_pa
     print("="*50)
     print(f"🎉 PROCESO COMPLETADO")
     print(f"⏱️  Tiempo total: {total_time:.2f}s")
-    print(f"📊 Filas procesadas: {len(rows):,}")
-    print(f"📈 Velocidad promedio: {len(rows)/total_time:.0f} filas/s")
+    print(f"📊 Filas procesadas: {n_rows:,}")
+    print(f"📈 Velocidad promedio: {n_rows/total_time:.0f} filas/s")
     print(f"🔒 Celdas con fórmula protegidas: {len(formula_cells):,}")
     print(f"🔗 Celdas merged protegidas: {len(merged_cells):,}")
     print("="*50)
\ No newline at end of file
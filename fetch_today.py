@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 #fetch_today.py
 
-import csv, base64, json, os
+import csv, base64, http.client, io, json, os, ssl, sys, threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextvars import ContextVar
 from datetime import date, datetime, timedelta
-from urllib import request, error
+from functools import lru_cache
+from urllib import error, request
+from urllib.parse import urlsplit
 from typing import Dict, Any, List, Tuple, Optional
 
-from config import BASE, USER, PASSWORD, TIMEOUT, TIENDAS, OUTPUT_DIR, CSV_COLUMNS
+from config import BASE, USER, PASSWORD, TIMEOUT, TIENDAS, OUTPUT_DIR, CSV_COLUMNS, BATCH_MAPPER, PARQUET_DIR, SQLITE_DB, ROLLUPS
+from config import MAX_CONCURRENT_REQUESTS
+from intermediates import ventas_path, open_text
 
 # ---------- fecha objetivo ----------
 def get_target_date() -> date:
@@ -16,16 +23,133 @@ def get_target_date() -> date:
         return date.fromisoformat(s)
     return date.today()
 
+# ---------- Cuenta TouchExpress activa ----------
+# Por defecto la de config (.env). multi_company.py fija otra por hilo con use_account().
+DEFAULT_ACCOUNT = {"nombre": "default", "base": BASE, "user": USER, "password": PASSWORD, "timeout": TIMEOUT}
+_account: ContextVar[dict] = ContextVar("touch_account", default=DEFAULT_ACCOUNT)
+_limiter: ContextVar[Any] = ContextVar("touch_limiter", default=None)
+
+def use_account(account: dict, limiter=None) -> dict:
+    """
+    Activa una cuenta en el contexto actual. limiter (opcional) debe tener
+    acquire(nombre)/release() y reparte el presupuesto global de peticiones.
+    """
+    acc = {**DEFAULT_ACCOUNT, **account, "peticiones": 0}
+    _account.set(acc)
+    _limiter.set(limiter)
+    return acc
+
+def api_url(endpoint: str) -> str:
+    return f"{_account.get()['base']}/{endpoint}"
+
 # ---------- HTTP ----------
+class ConnectionPool:
+    """
+    Conexiones HTTP/1.1 keep-alive por (esquema, host, puerto), compartidas por
+    todos los hilos y cuentas: cada petición toma una conexión libre (o abre
+    una) y la devuelve al terminar, en vez de abrir TCP + TLS cada vez.
+    Con proxy de entorno (HTTP_PROXY/HTTPS_PROXY) o ante una redirección se usa
+    urllib.request.urlopen, como antes del pool.
+    """
+    # La conexión reutilizada pudo cerrarla el servidor mientras estaba libre
+    _STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, max_idle_per_host: int = MAX_CONCURRENT_REQUESTS):
+        self.max_idle = max(1, max_idle_per_host)
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._ssl = ssl.create_default_context()
+        self._proxies = request.getproxies()
+        self._proxied: Dict[Tuple[str, str, int], bool] = {}
+        self.abiertas = 0  # conexiones creadas en total
+
+    def _via_proxy(self, key) -> bool:
+        if key not in self._proxied:
+            scheme, host, _ = key
+            self._proxied[key] = scheme in self._proxies and not request.proxy_bypass(host)
+        return self._proxied[key]
+
+    @staticmethod
+    def _urlopen(url: str, body: bytes, headers: Dict[str, str], timeout: float) -> bytes:
+        req = request.Request(url, data=body, method="POST", headers=headers)
+        with request.urlopen(req, timeout=timeout) as r:
+            return r.read()
+
+    def _take(self, key, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            libres = self._idle.get(key)
+            if libres:
+                conn = libres.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.abiertas += 1
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def _give_back(self, key, conn: http.client.HTTPConnection):
+        with self._lock:
+            libres = self._idle.setdefault(key, [])
+            if len(libres) < self.max_idle:
+                libres.append(conn)
+                return
+        conn.close()
+
+    def post(self, url: str, body: bytes, headers: Dict[str, str], timeout: float) -> bytes:
+        """POST y cuerpo de la respuesta; un estado >= 400 lanza urllib.error.HTTPError."""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        if self._via_proxy(key):
+            return self._urlopen(url, body, headers, timeout)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        while True:
+            conn, reused = self._take(key, timeout)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except self._STALE:
+                conn.close()
+                if reused:
+                    continue  # reintento con conexión nueva (consultas de solo lectura)
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._give_back(key, conn)
+            if 300 <= resp.status < 400:
+                return self._urlopen(url, body, headers, timeout)  # urllib sigue la redirección
+            if resp.status >= 400:
+                raise error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(raw))
+            return raw
+
+_pool = ConnectionPool()
+
 def http_post_json(url: str, payload: dict) -> Any:
+    acc = _account.get()
     data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-    req = request.Request(url, data=data, method="POST")
-    req.add_header("Content-Type", "application/json")
-    req.add_header("Accept", "application/json")
-    token = base64.b64encode(f"{USER}:{PASSWORD}".encode()).decode()
-    req.add_header("Authorization", f"Basic {token}")
-    with request.urlopen(req, timeout=TIMEOUT) as r:
-        raw = r.read().decode("utf-8", errors="replace")
+    token = base64.b64encode(f"{acc['user']}:{acc['password']}".encode()).decode()
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Authorization": f"Basic {token}",
+    }
+    limiter = _limiter.get()
+    if limiter is not None:
+        limiter.acquire(acc["nombre"])
+    try:
+        raw = _pool.post(url, data, headers, acc["timeout"]).decode("utf-8", errors="replace")
+    finally:
+        if limiter is not None:
+            limiter.release()
+    if "peticiones" in acc:
+        acc["peticiones"] += 1
 
     try:
         outer = json.loads(raw)
@@ -57,6 +181,28 @@ def fmt_fecha(dt: datetime) -> str:
 def fmt_jornada(dt: datetime) -> str:
     return f"{dt.day}/{dt.month}/{dt.year}"
 
+# ---------- Diccionario de valores repetidos ----------
+# json.loads crea un str nuevo por cada aparición de un valor y fmt_fecha /
+# fmt_jornada uno por línea: en un mes los mismos nombres (sección, servicio,
+# grupo, producto, cliente) y fechas se repiten decenas de miles de veces.
+# Los nombres y códigos de producto (conjunto acotado) se internan con
+# sys.intern: cada valor distinto vive una sola vez y las filas lo referencian.
+# En CPython 3.12+ los internados no se liberan nunca, así que las fechas no se
+# internan: las comparten cachés LRU de tamaño fijo (una FECHA por instante, una
+# JORNADA por día), que sí las sueltan al llenarse.
+def intern_text(v):
+    """Valor de texto compartido; lo que no es str se devuelve tal cual."""
+    return sys.intern(v) if type(v) is str else v
+
+@lru_cache(maxsize=64)
+def _jornada_de(d: date) -> str:
+    return fmt_jornada(d)
+
+@lru_cache(maxsize=65536)
+def fecha_jornada(dt: datetime) -> Tuple[str, str]:
+    """(FECHA, JORNADA) formateadas una vez por instante; la JORNADA, una vez por día."""
+    return fmt_fecha(dt), _jornada_de(dt.date())
+
 def pick_first_key(d: dict, *candidates: str):
     for k in candidates:
         if k in d and d[k] not in (None, ""):
@@ -90,7 +236,7 @@ def month_bounds(d: date):
 # ---------- Endpoints ----------
 def get_tiendas(dref: date) -> Dict[int, Dict[str, str]]:
     payload = {"TouchExpress_IF": {"Tienda": 1, "Fecha": dref.isoformat()}}
-    resp = http_post_json(f"{BASE}/MPTiendas", payload)
+    resp = http_post_json(api_url("MPTiendas"), payload)
     tiendas = resp.get("TouchExpress_IF", {}).get("Tiendas", [])
     out = {}
     for t in tiendas:
@@ -108,29 +254,159 @@ def get_tiendas(dref: date) -> Dict[int, Dict[str, str]]:
 
 def get_ventas_dia(tienda: int, d: date) -> List[dict]:
     payload = {"TouchExpress_IF": {"Tienda": tienda, "Fecha": d.isoformat()}}
-    resp = http_post_json(f"{BASE}/MPVentasMesa", payload)
+    resp = http_post_json(api_url("MPVentasMesa"), payload)
     te = resp.get("TouchExpress_IF", {}) if isinstance(resp, dict) else {}
     docs = te.get("Documentos") or []
     return docs if isinstance(docs, list) else []
 
 def get_compras_dia(tienda: int, d: date) -> List[dict]:
     payload = {"TouchExpress_IF": {"Tienda": tienda, "Fecha": d.isoformat()}}
-    resp = http_post_json(f"{BASE}/MPCompras", payload)
+    resp = http_post_json(api_url("MPCompras"), payload)
     te = resp.get("TouchExpress_IF", {}) if isinstance(resp, dict) else {}
     docs = te.get("Documentos") or []
     return docs if isinstance(docs, list) else []
 
+# ---------- Historial de costes ----------
+_EPOCH = datetime(1970, 1, 1)
+
+def dt_to_ts(dt: datetime) -> float:
+    """Segundos desde 1970 sin pasar por zona horaria (las fechas de la API son naive)."""
+    return (dt - _EPOCH).total_seconds()
+
+def ts_to_dt(ts: float) -> datetime:
+    return _EPOCH + timedelta(seconds=ts)
+
+class CostHistory:
+    """
+    Historial de costes unitarios de una tienda: por referencia, dos array('d')
+    paralelos (instante, coste) ordenados por instante. La consulta as-of es
+    un bisect, O(log n) por línea de venta.
+    """
+    __slots__ = ("_hist",)
+
+    def __init__(self):
+        self._hist: Dict[str, Tuple[array, array]] = {}
+
+    def add(self, ref: str, dt: datetime, unit: float):
+        ts = dt_to_ts(dt)
+        hist = self._hist.get(ref)
+        if hist is None:
+            self._hist[ref] = (array("d", [ts]), array("d", [unit]))
+            return
+        times, costs = hist
+        i = len(times) if ts >= times[-1] else bisect_right(times, ts)
+        # la misma compra vista dos veces (p.ej. al volver a consultar el día) no se duplica
+        j = i - 1
+        while j >= 0 and times[j] == ts:
+            if costs[j] == unit:
+                return
+            j -= 1
+        if i == len(times):
+            # caso habitual: las compras llegan en orden de fecha
+            times.append(ts)
+            costs.append(unit)
+        else:
+            times.insert(i, ts)
+            costs.insert(i, unit)
+
+    def asof(self, ref: str, dt: datetime) -> Optional[float]:
+        """
+        Coste de la compra más reciente con fecha <= dt. Si la venta es anterior
+        a la primera compra conocida, el de esa compra (None si no hay ninguna).
+        """
+        hist = self._hist.get(ref)
+        if hist is None:
+            return None
+        times, costs = hist
+        i = bisect_right(times, dt_to_ts(dt))
+        return costs[i - 1] if i else costs[0]
+
+    def last_before(self, ref: str, dt: datetime) -> Optional[Tuple[datetime, float]]:
+        """(fecha, coste) de la última compra con fecha < dt, o None."""
+        hist = self._hist.get(ref)
+        if hist is None:
+            return None
+        times, costs = hist
+        i = bisect_left(times, dt_to_ts(dt))
+        return (ts_to_dt(times[i - 1]), costs[i - 1]) if i else None
+
+    def history(self, ref: str) -> Optional[Tuple[array, array]]:
+        return self._hist.get(ref)
+
+    def __contains__(self, ref) -> bool:
+        return ref in self._hist
+
+    def __iter__(self):
+        return iter(self._hist)
+
+    def __len__(self) -> int:
+        return len(self._hist)
+
+def index_compras(hist: CostHistory, docs: List[dict]):
+    """Añade al historial el coste unitario (importe / cantidad) de cada línea de compra."""
+    for doc in docs:
+        fecha_iso = pick_first_key(doc, "fecha", "Fecha", "FechaReg")
+        if not fecha_iso: 
+            continue
+        dt = iso_to_dt(fecha_iso)
+        for p in (doc.get("productos") or []):
+            ref = p.get("referencia")
+            if ref in (None, ""): 
+                continue
+            cant = to_float(pick_first_key(p, "can tad", "cantidad"))
+            imp  = to_float(p.get("importe"))
+            if not cant or cant == 0 or imp is None:
+                continue
+            hist.add(str(ref), dt, imp / cant)
+
+def seed_costs(idx: Dict[int, CostHistory], start: date,
+               previo: Optional[Dict[int, CostHistory]] = None) -> int:
+    """
+    Siembra cada historial con la última compra anterior a start, para que las
+    ventas del mes previas a la primera compra del mes se valoren con el coste
+    vigente. Fuentes: el índice previo (checkpoint del servicio intradía) y la
+    tabla costes del almacén SQLite si DAILY_SQLITE_DB está configurado.
+    Devuelve cuántas referencias se han sembrado.
+    """
+    n = 0
+    if SQLITE_DB and os.path.exists(SQLITE_DB):
+        import warehouse
+        conn = warehouse.connect(SQLITE_DB)
+        try:
+            for tid, ref, dt, unit in warehouse.last_costs(conn, start):
+                if tid in idx:
+                    idx[tid].add(ref, dt, unit)
+                    n += 1
+        finally:
+            conn.close()
+    limite = datetime.combine(start, datetime.min.time())
+    for tid, hist in (previo or {}).items():
+        if tid not in idx:
+            continue
+        for ref in hist:
+            ultima = hist.last_before(ref, limite)
+            if ultima is not None:
+                idx[tid].add(ref, *ultima)
+                n += 1
+    return n
+
 # ---------- Cost index (del 1 del mes actual hasta el día objetivo) ----------
-def build_cost_index(tienda_ids: List[int], target_day: date):
+def build_cost_index(tienda_ids: List[int], target_day: date,
+                     previo: Optional[Dict[int, CostHistory]] = None) -> Dict[int, CostHistory]:
     """
-    Construye índice de costes desde el día 1 del mes ACTUAL hasta target_day
+    Construye índice de costes desde el día 1 del mes ACTUAL hasta target_day,
+    sembrado con la última compra anterior al mes (seed_costs).
+    Guarda todo el historial de compras por (tienda, referencia) para poder
+    valorar cada venta con el coste vigente en su fecha.
     """
     hoy = date.today()
     start = date(hoy.year, hoy.month, 1)  # 1º del mes ACTUAL
     
-    idx: Dict[int, Dict[str, Tuple[datetime, float]]] = {tid: {} for tid in tienda_ids}
+    idx: Dict[int, CostHistory] = {tid: CostHistory() for tid in tienda_ids}
+    sembradas = seed_costs(idx, start, previo)
     
-    print(f"Construyendo índice de costes desde {start} hasta {target_day}")
+    print(f"Construyendo índice de costes desde {start} hasta {target_day} "
+          f"({sembradas} referencias con coste anterior)")
     
     for d in daterange(start, target_day):  # 1º del mes actual .. día objetivo
         for tienda in tienda_ids:
@@ -141,24 +417,7 @@ def build_cost_index(tienda_ids: List[int], target_day: date):
                 print(f"  Error compras {d} tienda {tienda}: {e}")
                 continue
             
-            for doc in docs:
-                fecha_iso = pick_first_key(doc, "fecha", "Fecha", "FechaReg")
-                if not fecha_iso: 
-                    continue
-                dt = iso_to_dt(fecha_iso)
-                for p in (doc.get("productos") or []):
-                    ref = p.get("referencia")
-                    if ref in (None, ""): 
-                        continue
-                    ref_str = str(ref)
-                    cant = to_float(pick_first_key(p, "can tad", "cantidad"))
-                    imp  = to_float(p.get("importe"))
-                    if not cant or cant == 0 or imp is None:
-                        continue
-                    unit = imp / cant
-                    prev = idx[tienda].get(ref_str)
-                    if (prev is None) or (dt >= prev[0]):
-                        idx[tienda][ref_str] = (dt, unit)
+            index_compras(idx[tienda], docs)
     
     return idx
 
@@ -180,11 +439,18 @@ def make_rows_from_doc(doc, tienda_id, tienda_info, cost_index_for_tienda):
     cab_total = to_float(totales.get("total"))
     cab_base  = to_float(totales.get("baseImponible"))
 
+    # Textos de cabecera y fechas compartidos entre líneas, documentos y días
+    fecha, jornada = fecha_jornada(dt)
+    nnumbarra = intern_text(seccion.get("nombre") or "")
+    nservicio = intern_text(servicio.get("nombre") or "")
+    nombrecliente = intern_text(cliente.get("nombre") or "")
+    establecimiento = intern_text(tienda_info.get("nombre") or "")
+
     for p in (doc.get("productos") or []):
         ref = p.get("referencia")
-        ref_str = str(ref) if ref not in (None, "") else ""
-        desc = p.get("descripcion") or ""
-        grupo = p.get("grupo") or ""
+        ref_str = intern_text(str(ref)) if ref not in (None, "") else ""
+        desc = intern_text(p.get("descripcion") or "")
+        grupo = intern_text(p.get("grupo") or "")
 
         cantidad = to_float(pick_first_key(p, "can tad", "cantidad"))
         precio   = to_float(p.get("precio"))
@@ -197,16 +463,18 @@ def make_rows_from_doc(doc, tienda_id, tienda_info, cost_index_for_tienda):
         base_desc = round(imp_desc / (1.0 + iva/100.0), 6) if (imp_desc != "" and iva is not None) else ""
 
         coste = ""
-        if ref_str and ref_str in cost_index_for_tienda:
-            coste = round(cost_index_for_tienda[ref_str][1], 6)
+        if ref_str:
+            unit = cost_index_for_tienda.asof(ref_str, dt)
+            if unit is not None:
+                coste = round(unit, 6)
 
         fila = {
             "IDTRANS":"", "NSERIE":"", "SERIE":serie or "", "NUMTIKET":numtiket or "",
-            "NUMBARRA":seccion.get("codigo") or "", "NNUMBARRA":seccion.get("nombre") or "",
-            "FECHA":fmt_fecha(dt), "JORNADA":fmt_jornada(dt),
+            "NUMBARRA":seccion.get("codigo") or "", "NNUMBARRA":nnumbarra,
+            "FECHA":fecha, "JORNADA":jornada,
             "CREDITO":"","NCREDITO":"", "NUMCLIE":cliente.get("codigo") or "",
             "PUNTOVENTA":"","NPUNTOVENTA":"", "NUMCUEN":"","NNUMCUEN":"",
-            "SERVICIO":servicio.get("codigo") or "", "NSERVICIO":servicio.get("nombre") or "",
+            "SERVICIO":servicio.get("codigo") or "", "NSERVICIO":nservicio,
             "ALMACEN":"","NALMACEN":"", "CABIMPORTE":cab_total if cab_total is not None else "",
             "CABDESCUENTO":"", "CABNETO":cab_base if cab_base is not None else "",
             "CAMARERO":"","NCAMARERO":"","MACROGRUPO":"","NMACROGRUPO":"",
@@ -217,9 +485,9 @@ def make_rows_from_doc(doc, tienda_id, tienda_info, cost_index_for_tienda):
             "IMPORTESINIVA":base, "DESCUENTO":descuento if descuento is not None else "",
             "IMPORTEDESCUENTO":imp_desc, "IMPORTESINIVADESCUENTO":base_desc,
             "ANULADA":"","FORMATO":"","NFORMATO":"",
-            "TIENDA":tienda_id, "ESTABLECIMIENTO":tienda_info.get("nombre") or "",
+            "TIENDA":tienda_id, "ESTABLECIMIENTO":establecimiento,
             "CTACONTABLE":"", "CECO":"", "NIFCLIENTE":cliente.get("nif") or "",
-            "NOMBRECLIENTE":cliente.get("nombre") or "", "VENCIMIENTO":"","PROMOCION":"",
+            "NOMBRECLIENTE":nombrecliente, "VENCIMIENTO":"","PROMOCION":"",
             "COMENSALES":"", "COSTE":coste, "OBSERVACIONES":"",
             "Turno":"", "Denominacion 2":"", "Factura":"", "Motivo":""
         }
@@ -229,10 +497,19 @@ def make_rows_from_doc(doc, tienda_id, tienda_info, cost_index_for_tienda):
         filas.append(fila)
     return filas
 
-# ---------- MAIN CORREGIDO ----------
-def main():
-    target_day = get_target_date()
-    
+# ---------- Descarga del mes ----------
+def month_jornadas(target_day: date) -> List[str]:
+    """JORNADAs que cubre fetch_month (del 1 del mes actual a target_day)."""
+    hoy = date.today()
+    return [fmt_jornada(d) for d in daterange(date(hoy.year, hoy.month, 1), target_day)]
+
+def fetch_month(target_day: date, tiendas_filtro: Optional[List[int]] = TIENDAS,
+                cost_previo: Optional[Dict[int, CostHistory]] = None):
+    """
+    Tiendas, índice de costes y filas de ventas desde el 1 del mes actual hasta
+    target_day, usando la cuenta activa. cost_previo (opcional) siembra el
+    índice con los costes anteriores al mes. Devuelve (rows, tiendas, cost_index).
+    """
     # 🔑 CAMBIO CRÍTICO: Definir el rango de fechas para ventas
     hoy = date.today()
     start_date = date(hoy.year, hoy.month, 1)  # 1º del mes actual
@@ -245,15 +522,17 @@ def main():
     tiendas = get_tiendas(target_day)
     if not tiendas:
         raise SystemExit("No se han podido obtener tiendas.")
-    tienda_ids = sorted(tiendas.keys()) if TIENDAS is None else TIENDAS
+    tienda_ids = sorted(tiendas.keys()) if tiendas_filtro is None else tiendas_filtro
     print("Tiendas:", tienda_ids)
 
     # Índice de costes desde el 1 del mes hasta el día objetivo
     print("Construyendo índice de costes (MPCompras)…")
-    cost_index = build_cost_index(tienda_ids, target_day)
+    cost_index = build_cost_index(tienda_ids, target_day, cost_previo)
 
     # 🔑 CAMBIO PRINCIPAL: Ventas de TODO EL RANGO, no solo un día
     rows: List[dict] = []
+    if BATCH_MAPPER:
+        from batch_mapper import make_rows_from_docs
     
     for current_date in daterange(start_date, end_date):
         print(f"\n📊 Procesando ventas del {current_date}")
@@ -263,8 +542,15 @@ def main():
                 docs = get_ventas_dia(tid, current_date)
                 print(f"  Tienda {tid}: {len(docs)} documentos")
                 
+                if BATCH_MAPPER:
+                    # por tienda/día: un error queda en su bloque y los documentos se liberan
+                    rows.extend(make_rows_from_docs(((doc, tid) for doc in docs), tiendas, cost_index))
+                    continue
+                hist = cost_index.get(tid)
+                if hist is None:  # CostHistory vacío es falsy (__len__): comparar con None
+                    hist = CostHistory()
                 for doc in docs:
-                    rows.extend(make_rows_from_doc(doc, tid, tiendas.get(tid, {}), cost_index.get(tid, {})))
+                    rows.extend(make_rows_from_doc(doc, tid, tiendas.get(tid, {}), hist))
                     
             except error.HTTPError as e:
                 print(f"  [{current_date}] HTTPError tienda {tid}: {e.code}")
@@ -282,18 +568,50 @@ def main():
         print("\n📊 Distribución por fecha:")
         for fecha, count in sorted(fechas_count.items()):
             print(f"  {fecha}: {count} líneas")
-    
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    out_csv = os.path.join(OUTPUT_DIR, f"ventas_{target_day.isoformat()}.csv")
 
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
+    return rows, tiendas, cost_index
+
+def write_ventas_csv(rows: List[dict], out_dir: str, target_day: date) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    out_csv = ventas_path(out_dir, target_day)
+
+    with open_text(out_csv, "w") as f:
         writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
         writer.writeheader()
         if rows:
             writer.writerows(rows)
 
     print(f"\n✅ CSV generado: {out_csv}")
-    print(f"📁 Contiene ventas desde {start_date} hasta {end_date}")
+    return out_csv
+
+def publish_month(rows: List[dict], tiendas: Dict[int, Dict[str, str]],
+                  cost_index: Dict[int, CostHistory], target_day: date):
+    """CSV del día y salidas opcionales (cubos, Parquet, SQLite) de una descarga del mes."""
+    write_ventas_csv(rows, OUTPUT_DIR, target_day)
+    print(f"📁 Contiene ventas desde el 1 del mes hasta {target_day}")
+
+    if ROLLUPS:
+        from rollups import update_rollups
+        update_rollups(rows, OUTPUT_DIR, month_jornadas(target_day), TIENDAS)
+
+    if PARQUET_DIR:
+        from parquet_sink import write_parquet
+        write_parquet(rows, PARQUET_DIR)
+
+    if SQLITE_DB:
+        import warehouse
+        conn = warehouse.connect(SQLITE_DB)
+        warehouse.upsert_tiendas(conn, tiendas)
+        warehouse.upsert_costes(conn, cost_index)
+        n = warehouse.upsert_rows(conn, rows, month_jornadas(target_day), TIENDAS)
+        conn.close()
+        print(f"🗄️  SQLite actualizado: {SQLITE_DB} ({n} filas)")
+
+# ---------- MAIN CORREGIDO ----------
+def main():
+    target_day = get_target_date()
+    rows, tiendas, cost_index = fetch_month(target_day)
+    publish_month(rows, tiendas, cost_index, target_day)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
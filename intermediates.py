@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# intermediates.py
+"""
+Ficheros intermedios ventas_YYYY-MM-DD.csv, opcionalmente comprimidos:
+
+  DAILY_CSV_COMPRESSION=         ventas_YYYY-MM-DD.csv      (texto plano)
+  DAILY_CSV_COMPRESSION=gzip     ventas_YYYY-MM-DD.csv.gz
+  DAILY_CSV_COMPRESSION=zstd     ventas_YYYY-MM-DD.csv.zst  (requiere `zstandard`)
+
+El formato se deduce de la extensión, así que los lectores aceptan cualquiera
+de los tres. Los comprimidos se descomprimen en streaming mientras el módulo
+csv lee, sin cargar el fichero entero; los planos se leen con open().
+"""
+
+import gzip, io, os
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterator, TextIO
+
+from config import CSV_COMPRESSION
+
+try:
+    import zstandard
+except ImportError:  # opcional: solo para DAILY_CSV_COMPRESSION=zstd
+    zstandard = None
+
+SUFFIXES = {"": ".csv", "gzip": ".csv.gz", "zstd": ".csv.zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+def compression_of(path: str) -> str:
+    for kind, suffix in SUFFIXES.items():
+        if kind and path.endswith(suffix):
+            return kind
+    return ""
+
+def ventas_path(out_dir: str, day: date, compression: str = CSV_COMPRESSION) -> str:
+    if compression not in SUFFIXES:
+        raise SystemExit(f"DAILY_CSV_COMPRESSION no válido: {compression!r} (usa gzip, zstd o vacío)")
+    return os.path.join(out_dir, f"ventas_{day.isoformat()}{SUFFIXES[compression]}")
+
+def find_ventas(out_dir: str, day: date) -> str:
+    """El ventas_* del día que exista (primero el formato configurado); si no hay, la ruta configurada."""
+    preferida = ventas_path(out_dir, day)
+    for path in [preferida] + [ventas_path(out_dir, day, k) for k in SUFFIXES]:
+        if os.path.exists(path):
+            return path
+    return preferida
+
+def _require_zstd():
+    if zstandard is None:
+        raise SystemExit("Para ficheros .zst instala zstandard: pip install zstandard")
+
+@contextmanager
+def open_text(path: str, mode: str = "r", encoding: str = "utf-8") -> Iterator[TextIO]:
+    """
+    Abre un intermedio como texto para el módulo csv (newline="").
+    mode: "r" (descompresión en streaming), "w" o "a".
+    """
+    kind = compression_of(path)
+    if mode != "r":
+        if kind == "gzip":
+            f = gzip.open(path, f"{mode}t", compresslevel=GZIP_LEVEL, encoding=encoding, newline="")
+        elif kind == "zstd":
+            _require_zstd()
+            raw = open(path, f"{mode}b")  # "a": un frame zstd más al final
+            f = io.TextIOWrapper(zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw),
+                                 encoding=encoding, newline="")
+        else:
+            f = open(path, mode, newline="", encoding=encoding)
+        with f:
+            yield f
+        return
+
+    if kind == "gzip":
+        f = gzip.open(path, "rt", encoding=encoding, newline="")
+    elif kind == "zstd":
+        _require_zstd()
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+        f = io.TextIOWrapper(reader, encoding=encoding, newline="")
+    else:
+        f = open(path, newline="", encoding=encoding)
+    with f:
+        yield f
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# intraday.py
+"""
+Servicio intradía: mantiene en memoria tiendas, índice de costes y tickets ya
+vistos (TIENDA/SERIE/NUMTIKET) y consulta solo el día en curso cada
+DAILY_INTRADAY_INTERVAL segundos. Las líneas nuevas se anexan a:
+
+  - ventas_YYYY-MM-DD.csv[.gz|.zst] del día (siempre)
+  - los cubos rollup_*.csv (DAILY_ROLLUPS)
+  - BBDDcoste de Daily_YYYY-MM-DD.xlsx (--excel)
+  - una pestaña de Google Sheets (--sheets)
+
+El estado se guarda en un checkpoint tras cada ciclo; al reiniciar se retoma
+sin volver a pedir el mes completo. Al cambiar de día se consulta una última
+vez el día del checkpoint y cada día intermedio en que el servicio estuvo
+parado (hasta fin de mes si cambia el mes). Ctrl+C / SIGTERM terminan el ciclo en
+curso, guardan y salen.
+
+  python3 intraday.py --excel --sheets
+"""
+
+import argparse, calendar, csv, json, os, shutil, signal, threading, time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from config import OUTPUT_DIR, CSV_COLUMNS, TARGET_SHEET, TIENDAS, INTRADAY_INTERVAL, ROLLUPS
+import fetch_today
+from intermediates import find_ventas, open_text
+from fetch_today import (
+    CostHistory, get_tiendas, get_ventas_dia, get_compras_dia, build_cost_index,
+    index_compras, make_rows_from_doc, pick_first_key, ts_to_dt, fetch_month, publish_month,
+    iso_to_dt, fmt_fecha, to_float,
+)
+
+STATE_FILE = "intraday_state.json"
+
+# ---------- Utils ----------
+def ticket_key(tienda_id, serie, numtiket, fecha="", total="") -> str:
+    """
+    Clave de ticket. Sin número de ticket, la fecha (FECHA del CSV) y el total
+    (CABIMPORTE) identifican el documento; así la clave de un documento de la
+    API y la de sus filas en el CSV coinciden.
+    """
+    if numtiket in (None, ""):
+        numtiket = f"{fecha}/{total}"
+    return f"{tienda_id}|{serie or ''}|{numtiket}"
+
+def doc_ticket_key(doc: dict, tienda_id: int) -> str:
+    serie = pick_first_key(doc, "serie", "Serie")
+    numtiket = pick_first_key(doc, "num ket", "num tket", "numtiket", "num")
+    fecha_iso = pick_first_key(doc, "fecha", "Fecha", "FechaReg")
+    total = to_float((doc.get("totales") or {}).get("total"))
+    return ticket_key(tienda_id, serie, numtiket,
+                      fmt_fecha(iso_to_dt(fecha_iso)) if fecha_iso else "",
+                      "" if total is None else total)
+
+def csv_path(d: date) -> str:
+    return find_ventas(OUTPUT_DIR, d)
+
+def xlsx_path(d: date) -> str:
+    return os.path.join(OUTPUT_DIR, f"Daily_{d.isoformat()}.xlsx")
+
+# ---------- Estado ----------
+class IntradayState:
+    def __init__(self):
+        self.dia: Optional[date] = None
+        self.tiendas: Dict[int, Dict[str, str]] = {}
+        self.tienda_ids: List[int] = []
+        self.cost_index: Dict[int, CostHistory] = {}
+        self.seen: Set[str] = set()
+
+    def save(self, path: str):
+        costes = {
+            str(tid): {ref: [list(a) for a in hist.history(ref)] for ref in hist}
+            for tid, hist in self.cost_index.items()
+        }
+        data = {
+            "dia": self.dia.isoformat() if self.dia else None,
+            "tiendas": {str(k): v for k, v in self.tiendas.items()},
+            "tienda_ids": self.tienda_ids,
+            "seen": sorted(self.seen),
+            "costes": costes,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)  # escritura atómica
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IntradayState"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        st = cls()
+        st.dia = date.fromisoformat(data["dia"]) if data.get("dia") else None
+        st.tiendas = {int(k): v for k, v in data.get("tiendas", {}).items()}
+        st.tienda_ids = [int(t) for t in data.get("tienda_ids", [])]
+        st.seen = set(data.get("seen", []))
+        for tid, refs in data.get("costes", {}).items():
+            hist = st.cost_index.setdefault(int(tid), CostHistory())
+            for ref, (times, costs) in refs.items():
+                for ts, unit in zip(times, costs):
+                    hist.add(ref, ts_to_dt(ts), unit)
+        return st
+
+# ---------- Sinks ----------
+def append_csv(path: str, rows: List[dict]):
+    exists = os.path.exists(path)
+    with open_text(path, "a") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        if not exists:
+            writer.writeheader()
+        writer.writerows(rows)
+
+class SheetsSink:
+    """Anexa filas (layout CSV) a una pestaña de Google Sheets."""
+    def __init__(self, creds: str, sheet_id: str, worksheet: str):
+        import gspread
+        from push_daily_to_sheets import load_service_account
+        sh = load_service_account(creds).open_by_key(sheet_id)
+        try:
+            self.ws = sh.worksheet(worksheet)
+        except gspread.exceptions.WorksheetNotFound:
+            self.ws = sh.add_worksheet(title=worksheet, rows="1000", cols=str(len(CSV_COLUMNS)))
+            self.ws.append_row(CSV_COLUMNS, value_input_option="RAW")
+
+    def append(self, rows: List[dict]):
+        values = [[r.get(c, "") for c in CSV_COLUMNS] for r in rows]
+        self.ws.append_rows(values, value_input_option="RAW")
+
+# ---------- Servicio ----------
+class IntradayService:
+    def __init__(self, state_path: str, interval: int, excel: bool = False,
+                 sheets: Optional[SheetsSink] = None):
+        self.state_path = state_path
+        self.interval = interval
+        self.excel = excel
+        self.sheets = sheets
+        self.stop = threading.Event()
+        self.state = IntradayState.load(state_path) or IntradayState()
+        if self.state.dia is not None:
+            # El CSV del día es la referencia: si el proceso murió entre anexar
+            # líneas y guardar el checkpoint, esos tickets ya cuentan como vistos
+            self._seed_seen_from_csv(self.state.dia)
+
+    # --- arranque / cambio de día ---
+    def _seed_seen_from_csv(self, d: date):
+        """Marca como vistos los tickets del día que ya están en el CSV."""
+        path = csv_path(d)
+        if not os.path.exists(path):
+            return
+        jornada = fetch_today.fmt_jornada(d)
+        with open_text(path) as f:
+            for row in csv.DictReader(f):
+                if row.get("JORNADA") == jornada:
+                    self.state.seen.add(ticket_key(row.get("TIENDA"), row.get("SERIE"), row.get("NUMTIKET"),
+                                                   row.get("FECHA"), row.get("CABIMPORTE")))
+
+    def _cold_start(self, hoy: date):
+        """Sin checkpoint válido: carga completa del mes (una sola vez)."""
+        st = self.state
+        if not os.path.exists(csv_path(hoy)):
+            print("🧊 Sin CSV de hoy: ejecutando carga completa del mes…")
+            # tiendas e índice de costes de la descarga se quedan en el estado
+            rows, st.tiendas, st.cost_index = fetch_month(hoy, cost_previo=st.cost_index)
+            publish_month(rows, st.tiendas, st.cost_index, hoy)
+            del rows
+            st.tienda_ids = sorted(st.tiendas.keys()) if TIENDAS is None else TIENDAS
+        else:
+            st.tiendas = get_tiendas(hoy)
+            st.tienda_ids = sorted(st.tiendas.keys()) if TIENDAS is None else TIENDAS
+            st.cost_index = build_cost_index(st.tienda_ids, hoy, st.cost_index)
+        st.seen = set()
+        st.dia = hoy
+        self._seed_seen_from_csv(hoy)
+
+    def _roll_day(self, d: date):
+        """Día siguiente del mismo mes: el CSV de d parte del del día anterior."""
+        st = self.state
+        prev = csv_path(st.dia)
+        if os.path.exists(prev) and not os.path.exists(csv_path(d)):
+            # mismo formato (y compresión) que el del día anterior
+            shutil.copy2(prev, prev.replace(st.dia.isoformat(), d.isoformat()))
+        if self.excel and os.path.exists(xlsx_path(st.dia)) and not os.path.exists(xlsx_path(d)):
+            shutil.copy2(xlsx_path(st.dia), xlsx_path(d))
+        st.seen = set()
+        st.dia = d
+        self._seed_seen_from_csv(d)
+
+    def _close_days(self, hasta: date) -> List[dict]:
+        """
+        Cierra el día del checkpoint (ventas posteriores al último ciclo) y
+        recorre los días siguientes hasta `hasta` incluido, que no se
+        consultaron por estar el servicio parado.
+        """
+        st = self.state
+        nuevas = self.poll_day(st.dia)
+        while st.dia < hasta:
+            self._roll_day(st.dia + timedelta(days=1))
+            nuevas.extend(self.poll_day(st.dia))
+            st.save(self.state_path)
+        return nuevas
+
+    def ensure_day(self) -> List[dict]:
+        """Deja el estado en el día de hoy; devuelve las líneas recuperadas de días anteriores."""
+        hoy = date.today()
+        st = self.state
+        nuevas: List[dict] = []
+        if st.dia is None or not st.tienda_ids:
+            self._cold_start(hoy)
+        elif (st.dia.year, st.dia.month) != (hoy.year, hoy.month):
+            fin_mes = date(st.dia.year, st.dia.month, calendar.monthrange(st.dia.year, st.dia.month)[1])
+            nuevas = self._close_days(fin_mes)
+            self._cold_start(hoy)
+        elif st.dia != hoy:
+            nuevas = self._close_days(hoy - timedelta(days=1))
+            self._roll_day(hoy)
+        return nuevas
+
+    # --- ciclo ---
+    def refresh_costes(self, d: date):
+        st = self.state
+        for tid in st.tienda_ids:
+            try:
+                docs = get_compras_dia(tid, d)
+            except Exception as e:
+                print(f"  Error compras {d} tienda {tid}: {e}")
+                continue
+            index_compras(st.cost_index.setdefault(tid, CostHistory()), docs)
+
+    def poll_day(self, d: date) -> List[dict]:
+        """Compras y ventas del día d: anexa a los ficheros de d las líneas de tickets no vistos."""
+        st = self.state
+        self.refresh_costes(d)
+
+        nuevas: List[dict] = []
+        for tid in st.tienda_ids:
+            try:
+                docs = get_ventas_dia(tid, d)
+            except Exception as e:
+                print(f"  [{d}] Error tienda {tid}: {e}")
+                continue
+            hist = st.cost_index.get(tid)
+            if hist is None:  # CostHistory vacío es falsy (__len__): comparar con None
+                hist = CostHistory()
+            for doc in docs:
+                key = doc_ticket_key(doc, tid)
+                if key in st.seen:
+                    continue
+                filas = make_rows_from_doc(doc, tid, st.tiendas.get(tid, {}), hist)
+                nuevas.extend(filas)
+                st.seen.add(key)
+
+        if nuevas:
+            append_csv(csv_path(d), nuevas)
+            if ROLLUPS:
+                from rollups import add_to_rollups
+                add_to_rollups(nuevas, OUTPUT_DIR)
+            if self.excel and os.path.exists(xlsx_path(d)):
+                from excel_writer import append_rows_to_sheet
+                append_rows_to_sheet(xlsx_path(d), TARGET_SHEET, nuevas)
+            if self.sheets is not None:
+                self.sheets.append(nuevas)
+        return nuevas
+
+    def poll_once(self) -> List[dict]:
+        nuevas = self.ensure_day()
+        nuevas.extend(self.poll_day(self.state.dia))
+        self.state.save(self.state_path)
+        return nuevas
+
+    def run(self):
+        print(f"⏱️  Servicio intradía: consulta cada {self.interval}s (Ctrl+C para salir)")
+        while not self.stop.is_set():
+            start_time = time.time()
+            try:
+                nuevas = self.poll_once()
+                print(f"[{datetime.now():%H:%M:%S}] {len(nuevas)} líneas nuevas "
+                      f"({len(self.state.seen)} tickets hoy) en {time.time() - start_time:.1f}s")
+            except Exception as e:
+                print(f"[{datetime.now():%H:%M:%S}] ❌ Error en el ciclo: {e}")
+            self.stop.wait(self.interval)
+        self.state.save(self.state_path)
+        print("👋 Servicio detenido; estado guardado.")
+
+def main():
+    ap = argparse.ArgumentParser(description="Servicio intradía: anexa solo las ventas nuevas del día.")
+    ap.add_argument("--interval", type=int, default=INTRADAY_INTERVAL, help="Segundos entre consultas")
+    ap.add_argument("--state", default=os.path.join(OUTPUT_DIR, STATE_FILE), help="Fichero de checkpoint")
+    ap.add_argument("--excel", action="store_true", help="Anexar también a BBDDcoste de Daily_YYYY-MM-DD.xlsx")
+    ap.add_argument("--sheets", action="store_true", help="Anexar también a Google Sheets")
+    ap.add_argument("--creds", help="Ruta al JSON de Service Account (o GOOGLE_SA_JSON en .env)")
+    ap.add_argument("--sheet-id", help="Spreadsheet ID destino (o GOOGLE_SHEET_ID en .env)")
+    ap.add_argument("--worksheet", default=TARGET_SHEET, help="Pestaña destino en Sheets (por defecto: BBDDcoste)")
+    ap.add_argument("--once", action="store_true", help="Un único ciclo y salir")
+    args = ap.parse_args()
+
+    sheets = None
+    if args.sheets:
+        creds = args.creds or os.getenv("GOOGLE_SA_JSON")
+        sheet_id = args.sheet_id or os.getenv("GOOGLE_SHEET_ID")
+        if not creds or not sheet_id:
+            raise SystemExit("--sheets requiere --creds/--sheet-id o GOOGLE_SA_JSON/GOOGLE_SHEET_ID en .env")
+        sheets = SheetsSink(creds, sheet_id, args.worksheet)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    svc = IntradayService(args.state, args.interval, excel=args.excel, sheets=sheets)
+    if args.once:
+        nuevas = svc.poll_once()
+        print(f"✅ {len(nuevas)} líneas nuevas")
+        return
+
+    def _stop(signum, frame):
+        print("\n⏹️  Señal recibida, terminando tras el ciclo en curso…")
+        svc.stop.set()
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    svc.run()
+
+if __name__ == "__main__":
+    main()
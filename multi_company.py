@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# multi_company.py
+"""
+Ejecuta el pipeline diario para varias cuentas TouchExpress en un solo proceso.
+
+Cada cuenta (tenant) corre en su propio hilo con su directorio de salida,
+lista de tiendas e índice de costes. Todas comparten un presupuesto global de
+peticiones simultáneas a la API (TOUCH_MAX_CONCURRENT) que se reparte por
+turnos entre cuentas, para que una empresa grande no acapare la API, y un
+pool de conexiones keep-alive (fetch_today.ConnectionPool).
+
+Perfiles en JSON (DAILY_TENANTS o --tenants):
+
+  [
+    {"nombre": "empresa1", "user": "...", "password_env": "EMPRESA1_PASSWORD",
+     "tiendas": "1,2,3", "output_dir": "salida/empresa1"},
+    {"nombre": "empresa2", "user": "...", "password": "...", "base": "https://..."}
+  ]
+
+  python3 multi_company.py [--solo-csv]
+"""
+
+import argparse, json, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from config import OUTPUT_DIR, TEMPLATE_XLSX, TENANTS_FILE, MAX_CONCURRENT_REQUESTS, ROLLUPS, _parse_tiendas
+import fetch_today
+from fetch_today import get_target_date, use_account, fetch_month, write_ventas_csv, month_jornadas
+
+# ---------- Presupuesto de peticiones ----------
+class FairLimiter:
+    """
+    Semáforo de max_concurrent plazas con reparto round-robin: cuando hay
+    cuentas esperando, la plaza libre va a la que lleva más tiempo sin turno.
+    """
+    def __init__(self, max_concurrent: int):
+        self._cond = threading.Condition()
+        self._free = max(1, max_concurrent)
+        self._waiting: "OrderedDict[str, int]" = OrderedDict()  # orden = turno
+
+    def acquire(self, tenant: str):
+        with self._cond:
+            self._waiting[tenant] = self._waiting.get(tenant, 0) + 1
+            while not (self._free > 0 and next(iter(self._waiting)) == tenant):
+                self._cond.wait()
+            self._free -= 1
+            pendientes = self._waiting.pop(tenant) - 1
+            if pendientes:
+                self._waiting[tenant] = pendientes  # vuelve al final de la cola
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._free += 1
+            self._cond.notify_all()
+
+# ---------- Perfiles ----------
+def load_profiles(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        raise SystemExit(f"No encuentro el fichero de cuentas: {path}")
+    with open(path, encoding="utf-8") as f:
+        perfiles = json.load(f)
+    out = []
+    for i, p in enumerate(perfiles):
+        nombre = p.get("nombre") or f"cuenta{i + 1}"
+        password = p.get("password")
+        if password is None and p.get("password_env"):
+            password = os.getenv(p["password_env"], "")
+        account = {"nombre": nombre, "user": p.get("user", ""), "password": password or ""}
+        if p.get("base"):
+            account["base"] = p["base"]
+        if p.get("timeout"):
+            account["timeout"] = int(p["timeout"])
+        tiendas = p.get("tiendas")
+        out.append({
+            "account": account,
+            "tiendas": _parse_tiendas(tiendas) if isinstance(tiendas, str) else tiendas,
+            "output_dir": p.get("output_dir") or os.path.join(OUTPUT_DIR, nombre),
+            "template": p.get("template") or TEMPLATE_XLSX,
+        })
+    return out
+
+# ---------- Ejecución por cuenta ----------
+def run_tenant(profile: Dict[str, Any], target_day, limiter: FairLimiter, build: bool) -> Dict[str, Any]:
+    nombre = profile["account"]["nombre"]
+    acc = use_account(profile["account"], limiter)
+    stats: Dict[str, Any] = {"nombre": nombre, "ok": False, "filas": 0}
+    t0 = time.time()
+    try:
+        rows, _tiendas, _cost_index = fetch_month(target_day, profile["tiendas"])
+        write_ventas_csv(rows, profile["output_dir"], target_day)
+        if ROLLUPS:
+            from rollups import update_rollups
+            update_rollups(rows, profile["output_dir"], month_jornadas(target_day), profile["tiendas"])
+        stats["filas"] = len(rows)
+        stats["fetch_s"] = time.time() - t0
+        if build:
+            from build_daily_today import build_daily
+            t1 = time.time()
+            build_daily(profile["output_dir"], target_day, profile["template"])
+            stats["build_s"] = time.time() - t1
+        stats["ok"] = True
+    except (Exception, SystemExit) as e:  # una cuenta con error no tumba al resto
+        stats["error"] = str(e)
+    stats["peticiones"] = acc["peticiones"]
+    stats["total_s"] = time.time() - t0
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Pipeline diario para varias cuentas TouchExpress en un proceso.")
+    ap.add_argument("--tenants", default=TENANTS_FILE, help="JSON con los perfiles (o DAILY_TENANTS en .env)")
+    ap.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT_REQUESTS,
+                    help="Peticiones simultáneas a la API entre todas las cuentas")
+    ap.add_argument("--solo-csv", action="store_true", help="Solo descarga (sin construir el Daily)")
+    args = ap.parse_args()
+
+    perfiles = load_profiles(args.tenants)
+    target_day = get_target_date()
+    limiter = FairLimiter(args.max_concurrent)
+    print(f"🏢 {len(perfiles)} cuentas · {args.max_concurrent} peticiones simultáneas · día {target_day}")
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=len(perfiles) or 1) as pool:
+        futures = [pool.submit(run_tenant, p, target_day, limiter, not args.solo_csv) for p in perfiles]
+        resultados = [f.result() for f in futures]
+
+    print("=" * 50)
+    for r in resultados:
+        estado = "✅" if r["ok"] else f"❌ {r.get('error')}"
+        detalle = f"descarga {r.get('fetch_s', 0):.1f}s"
+        if "build_s" in r:
+            detalle += f" · Daily {r['build_s']:.1f}s"
+        print(f"{r['nombre']:<20} {r['filas']:>7} filas · {r['peticiones']:>5} peticiones · "
+              f"{detalle} · total {r['total_s']:.1f}s {estado}")
+    print(f"🔌 Conexiones HTTP abiertas: {fetch_today._pool.abiertas} (keep-alive compartidas entre cuentas)")
+    print(f"⏱️  Tiempo total: {time.time() - t0:.1f}s")
+    if not all(r["ok"] for r in resultados):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# parquet_sink.py
+"""
+Salida columnar (Parquet) de las filas de ventas, con tipos por columna y
+particionada por mes y tienda:
+
+  <PARQUET_DIR>/MES=2025-08/TIENDA=1/part-0.parquet
+
+Cada ejecución reescribe solo las particiones (mes, tienda) que trae, así que
+el fichero del mes en curso no se duplica día a día como el CSV. Dentro de
+cada partición las filas van ordenadas por FECHA, de modo que las estadísticas
+de row group permiten filtrar por fecha sin leer el fichero entero.
+"""
+
+import time
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # dependencia opcional
+    pa = ds = None
+
+from config import CSV_COLUMNS
+from excel_writer import DATETIME_COL, DATE_COL, NUMERIC_COLUMNS, safe_float, parse_dt, parse_d
+
+PARTITION_COLS = ["MES", "TIENDA"]
+
+def _require_pyarrow():
+    if pa is None:
+        raise SystemExit("La salida Parquet necesita pyarrow (pip install pyarrow)")
+
+def arrow_schema() -> "pa.Schema":
+    """Esquema tipado: numéricas float64, FECHA timestamp, JORNADA date, resto texto."""
+    _require_pyarrow()
+    fields = []
+    for col in CSV_COLUMNS:
+        if col == "TIENDA":
+            fields.append(pa.field(col, pa.int32()))
+        elif col in NUMERIC_COLUMNS:
+            fields.append(pa.field(col, pa.float64()))
+        elif col == DATETIME_COL:
+            fields.append(pa.field(col, pa.timestamp("s")))
+        elif col == DATE_COL:
+            fields.append(pa.field(col, pa.date32()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    fields.append(pa.field("MES", pa.string()))
+    return pa.schema(fields)
+
+def _typed(col: str, val: Any):
+    if val is None or val == "":
+        return None
+    if col == "TIENDA":
+        num = safe_float(val)
+        return int(num) if num is not None else None
+    if col in NUMERIC_COLUMNS:
+        return safe_float(val)
+    if col == DATETIME_COL:
+        return val if isinstance(val, datetime) else parse_dt(str(val))
+    if col == DATE_COL:
+        return val if isinstance(val, date) else parse_d(str(val))
+    return str(val)
+
+def rows_to_table(rows: List[Dict[str, Any]]) -> "pa.Table":
+    """Convierte filas de make_rows_from_doc (o del CSV) a una tabla Arrow tipada."""
+    schema = arrow_schema()
+    columns: Dict[str, list] = {}
+    for col in CSV_COLUMNS:
+        columns[col] = [_typed(col, r.get(col, "")) for r in rows]
+    columns["MES"] = [f"{d.year}-{d.month:02d}" if d else "" for d in columns[DATE_COL]]
+    table = pa.Table.from_pydict(columns, schema=schema)
+    return table.sort_by([("TIENDA", "ascending"), (DATETIME_COL, "ascending")])
+
+def write_parquet(rows: List[Dict[str, Any]], out_dir: str) -> int:
+    """
+    Escribe las filas en out_dir particionadas por MES/TIENDA. Las particiones
+    presentes en rows se sustituyen; el resto del dataset no se toca.
+    """
+    _require_pyarrow()
+    if not rows:
+        return 0
+    print(f"🧱 Escribiendo Parquet en {out_dir}…")
+    start_time = time.time()
+
+    table = rows_to_table(rows)
+    ds.write_dataset(
+        table, out_dir, format="parquet",
+        partitioning=ds.partitioning(table.select(PARTITION_COLS).schema, flavor="hive"),
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=16384,
+    )
+
+    elapsed = time.time() - start_time
+    print(f"✅ Parquet escrito: {table.num_rows} filas en {elapsed:.2f}s")
+    return table.num_rows
+
+def read_parquet(out_dir: str, columns: Optional[Sequence[str]] = None,
+                 desde: Optional[date] = None, hasta: Optional[date] = None,
+                 tiendas: Optional[Sequence[int]] = None) -> "pa.Table":
+    """
+    Lee solo las columnas y particiones necesarias. Los filtros por JORNADA
+    descartan meses completos por partición y row groups por estadísticas.
+    """
+    _require_pyarrow()
+    dataset = ds.dataset(out_dir, format="parquet", partitioning="hive", schema=arrow_schema())
+    flt = None
+    def _and(expr):
+        return expr if flt is None else flt & expr
+    if desde is not None:
+        flt = _and((ds.field("MES") >= f"{desde.year}-{desde.month:02d}") & (ds.field(DATE_COL) >= desde))
+    if hasta is not None:
+        flt = _and((ds.field("MES") <= f"{hasta.year}-{hasta.month:02d}") & (ds.field(DATE_COL) <= hasta))
+    if tiendas:
+        flt = _and(ds.field("TIENDA").isin(list(tiendas)))
+    return dataset.to_table(columns=list(columns) if columns else None, filter=flt)
@@ -4,11 +4,11 @@
 import os
 import argparse
 from datetime import date
+from numbers import Real
+from typing import Any, Iterator, List, Tuple
 
-import pandas as pd
-import gspread
-from gspread_dataframe import set_with_dataframe
-from google.oauth2.service_account import Credentials
+# gspread / openpyxl se importan dentro de las funciones: `--help` y los
+# arranques que no llegan a subir nada no pagan su tiempo de importación.
 
 try:
     # Carga .env si existe (opcional)
@@ -19,8 +19,11 @@ except Exception:
 
 # --- Config por defecto ---
 DEFAULT_WORKSHEET = "Daily"
+CHUNK_ROWS = 1000  # filas por petición a la API de Sheets
 
 def load_service_account(creds_json_path: str):
+    import gspread
+    from google.oauth2.service_account import Credentials
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
@@ -29,17 +32,96 @@ def load_service_account(creds_json_path: str):
     client = gspread.authorize(creds)
     return client
 
-def read_daily_from_xlsx(xlsx_path: str, sheet_name: str = DEFAULT_WORKSHEET) -> pd.DataFrame:
-    # Lee la hoja 'Daily'; pandas toma el valor visible en celdas merged
-    df = pd.read_excel(xlsx_path, sheet_name=sheet_name, engine="openpyxl", dtype=object)
-    return df.fillna("")
+def _cellrepr(value: Any):
+    # Misma representación que gspread_dataframe: números tal cual, resto a texto
+    if value is None:
+        return ""
+    if isinstance(value, Real):
+        return value
+    value = str(value)
+    return f"'{value}" if value.startswith("'") else value
+
+def open_daily_rows(xlsx_path: str, sheet_name: str = DEFAULT_WORKSHEET) -> Tuple[Iterator[List[Any]], int, int]:
+    """
+    Abre la hoja en modo read_only (valores cacheados) y devuelve
+    (filas, nº filas estimado, nº columnas). Las filas se generan una a una,
+    cabecera incluida, sin cargar el libro entero; las filas vacías del final
+    se descartan.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    if sheet_name not in wb.sheetnames:
+        wb.close()
+        raise SystemExit(f"No existe la hoja '{sheet_name}' en {xlsx_path}")
+    ws = wb[sheet_name]
+    n_rows, n_cols = ws.max_row or 0, ws.max_column or 0
+
+    def _rows():
+        try:
+            width = n_cols
+            vacias = 0
+            for row in ws.iter_rows(values_only=True):
+                if not width:
+                    width = len(row)
+                vals = [_cellrepr(v) for v in row[:width]]
+                vals.extend([""] * (width - len(vals)))
+                if all(v == "" for v in vals):
+                    vacias += 1  # solo se emiten si luego hay datos
+                    continue
+                for _ in range(vacias):
+                    yield [""] * width
+                vacias = 0
+                yield vals
+        finally:
+            wb.close()
+
+    return _rows(), n_rows, n_cols
+
+def iso_dates(tabla: List[List[Any]], col: str = "JORNADA"):
+    """
+    Pasa la columna de fecha de d/m/aaaa a AAAA-MM-DD. Con USER_ENTERED, Sheets
+    interpreta d/m/aaaa según la configuración regional de la hoja (en en_US
+    1/8/2025 sería el 8 de enero); el formato ISO se lee igual en todas.
+    """
+    from excel_writer import parse_d
+    idx = tabla[0].index(col)
+    for row in tabla[1:]:
+        d = parse_d(row[idx])
+        if d is not None:
+            row[idx] = d.isoformat()
 
 def clear_worksheet(ws):
     ws.clear()
 
-def push_dataframe(df: pd.DataFrame, ws):
-    # RAW por defecto en gspread_dataframe
-    set_with_dataframe(ws, df, include_index=False, include_column_header=True, resize=True)
+def push_rows(ws, rows: Iterator[List[Any]], n_cols: int, size_hint: int = 0,
+              chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Sube las filas por bloques de chunk_rows (una petición por bloque) y deja
+    la pestaña con el tamaño exacto de los datos. Devuelve las filas subidas.
+    """
+    ws.resize(rows=max(size_hint, 1), cols=max(n_cols, 1))
+    written = 0
+    chunk: List[List[Any]] = []
+
+    def _flush():
+        nonlocal written
+        end = written + len(chunk)
+        if end > ws.row_count:
+            ws.add_rows(end - ws.row_count)
+        ws.update(range_name=f"A{written + 1}", values=chunk, value_input_option="USER_ENTERED")
+        written = end
+        print(f"  ↑ {written} filas")
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            _flush()
+            chunk = []
+    if chunk:
+        _flush()
+
+    ws.resize(rows=max(written, 1), cols=max(n_cols, 1))
+    return written
 
 def main():
     ap = argparse.ArgumentParser(
@@ -50,6 +132,9 @@ def main():
     ap.add_argument("--xlsx", help="Ruta al XLSX con la hoja 'Daily'. Por defecto: Daily_YYYY-MM-DD.xlsx en cwd")
     ap.add_argument("--worksheet", default=DEFAULT_WORKSHEET, help="Nombre de la pestaña destino (por defecto: Daily)")
     ap.add_argument("--source-sheet", default=DEFAULT_WORKSHEET, help="Nombre de la hoja en el XLSX origen (por defecto: Daily)")
+    ap.add_argument("--from-csv", help="Sube el resumen calculado desde este ventas_*.csv en lugar de leer el XLSX")
+    ap.add_argument("--nivel", default="dia", choices=["dia", "grupo", "producto"],
+                    help="Nivel del resumen con --from-csv (por defecto: dia)")
     args = ap.parse_args()
 
     # Fallbacks desde .env
@@ -65,17 +150,28 @@ def main():
             raise SystemExit("--creds requerido o variable GOOGLE_SA_JSON en .env")
         args.creds = env_path
 
-    if not args.xlsx:
-        hoy = date.today().isoformat()
-        args.xlsx = os.path.join(os.getcwd(), f"Daily_{hoy}.xlsx")
-
-    if not os.path.exists(args.xlsx):
-        raise SystemExit(f"No encuentro el fichero: {args.xlsx}")
-
-    print(f"→ Cargando XLSX: {args.xlsx} (hoja origen: {args.source_sheet})")
-    df = read_daily_from_xlsx(args.xlsx, sheet_name=args.source_sheet)
-    print(f"→ Filas: {len(df)} · Columnas: {len(df.columns)}")
-
+    if args.from_csv:
+        if not os.path.exists(args.from_csv):
+            raise SystemExit(f"No encuentro el fichero: {args.from_csv}")
+        # Valores calculados en proceso: no hace falta abrir el XLSX en Excel
+        from daily_summary import load_csv_columns, summarize
+        print(f"→ Calculando resumen ({args.nivel}) desde: {args.from_csv}")
+        tabla = summarize(load_csv_columns(args.from_csv), args.nivel)
+        iso_dates(tabla)
+        rows, n_rows, n_cols = iter(tabla), len(tabla), len(tabla[0])
+    else:
+        if not args.xlsx:
+            hoy = date.today().isoformat()
+            args.xlsx = os.path.join(os.getcwd(), f"Daily_{hoy}.xlsx")
+
+        if not os.path.exists(args.xlsx):
+            raise SystemExit(f"No encuentro el fichero: {args.xlsx}")
+
+        print(f"→ Abriendo XLSX: {args.xlsx} (hoja origen: {args.source_sheet})")
+        rows, n_rows, n_cols = open_daily_rows(args.xlsx, sheet_name=args.source_sheet)
+    print(f"→ Filas (máx.): {n_rows} · Columnas: {n_cols}")
+
+    import gspread
     gc = load_service_account(args.creds)
     sh = gc.open_by_key(args.sheet_id)
 
@@ -85,15 +181,16 @@ def main():
     except gspread.exceptions.WorksheetNotFound:
         ws = sh.add_worksheet(
             title=args.worksheet,
-            rows=str(max(1000, len(df) + 10)),
-            cols=str(max(26, len(df.columns) + 5)),
+            rows=str(max(1000, n_rows + 10)),
+            cols=str(max(26, n_cols + 5)),
         )
 
     print(f"→ Limpiando pestaña destino: {args.worksheet}")
     clear_worksheet(ws)
 
     print("→ Subiendo datos…")
-    push_dataframe(df, ws)
+    n = push_rows(ws, rows, n_cols, size_hint=n_rows)
+    print(f"→ Filas subidas: {n}")
 
     print("✅ Listo. Google Sheet actualizado.")
 
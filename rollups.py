@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# rollups.py
+"""
+Cubos de ventas pre-agregados, mantenidos junto a fetch_today.main():
+
+  rollup_dia.csv       TIENDA, JORNADA
+  rollup_grupo.csv     TIENDA, JORNADA, NGRUPO
+  rollup_producto.csv  TIENDA, JORNADA, PRODUCTO
+
+Cada celda guarda los totales de CANTIDAD, IMPORTE, IMPORTESINIVA, DESCUENTO,
+IMPORTESINIVADESCUENTO y COSTE (unitario x cantidad), más LINEAS y
+LINEAS_SIN_COSTE. El cubo se organiza en porciones (TIENDA, JORNADA): una
+descarga solo reemplaza las porciones de los días que ha pedido y el servicio
+intradía suma las líneas nuevas a la porción de hoy. El resto del histórico no
+se toca.
+
+Los informes (hojas de resumen del Daily, cuadros mensuales) leen unos cientos
+de filas del cubo en lugar de re-agregar ventas_*.csv línea a línea.
+
+  python3 rollups.py ventas_2025-08-20.csv          # reconstruye los cubos desde un CSV
+  python3 rollups.py --nivel grupo --desde 2025-08-01 --hasta 2025-08-20
+"""
+
+import argparse, csv, os, sys, time
+from datetime import date
+from typing import Dict, Any, List, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import OUTPUT_DIR
+from excel_writer import DATE_COL, safe_float, parse_d
+from daily_summary import (
+    LEVELS, MEASURES, VentasColumns, columns_from_rows, load_csv_columns, group_index,
+    group_measures, metrics_from_measures, build_table,
+)
+
+SliceKey = Tuple[str, str]  # (TIENDA, JORNADA)
+Cell = Tuple[Tuple[str, ...], List[float]]  # (descriptivos, medidas)
+
+def rollup_path(out_dir: str, level: str) -> str:
+    return os.path.join(out_dir, f"rollup_{level}.csv")
+
+def _slice_order(s: SliceKey):
+    tienda = safe_float(s[0])
+    return (tienda is None, tienda or 0.0, parse_d(s[1]) or date.min, s)
+
+# ---------- Cubo ----------
+class RollupCube:
+    """
+    Cubo de un nivel: {(TIENDA, JORNADA): {resto de la clave: (descriptivos, [medidas])}}.
+    Los descriptivos (ESTABLECIMIENTO, NPRODUCTO…) son los de la última carga.
+    """
+    def __init__(self, level: str):
+        self.level = level
+        self.by, self.extra = LEVELS[level]
+        self.slices: Dict[SliceKey, Dict[Tuple[str, ...], Cell]] = {}
+
+    @property
+    def header(self) -> List[str]:
+        return list(self.by) + list(self.extra) + MEASURES
+
+    def __len__(self) -> int:
+        return sum(len(cells) for cells in self.slices.values())
+
+    def aggregate(self, data: VentasColumns) -> Dict[SliceKey, Dict[Tuple[str, ...], Cell]]:
+        """Agrega líneas de ventas al grano del cubo, agrupadas por porción."""
+        out: Dict[SliceKey, Dict[Tuple[str, ...], Cell]] = {}
+        if data.n == 0:
+            return out
+        claves, inverse, ng = group_index(data, self.by, self.extra)
+        medidas = group_measures(data, inverse, ng)
+        cols = [medidas[c].tolist() for c in MEASURES]
+        nb = len(self.by)
+        for g, k in enumerate(claves):
+            cells = out.setdefault((k[0], k[1]), {})
+            cells[tuple(k[2:nb])] = (tuple(k[nb:]), [col[g] for col in cols])
+        return out
+
+    def replace_days(self, data: VentasColumns, jornadas: Iterable[str],
+                     tiendas: Optional[Sequence[int]] = None) -> int:
+        """
+        Reemplaza las porciones de los días descargados (y de las tiendas pedidas,
+        o todas). Un día/tienda sin ventas queda sin porción. Devuelve cuántas
+        porciones se han escrito.
+        """
+        jornadas = set(jornadas)
+        filtro = None if tiendas is None else {str(t) for t in tiendas}
+        for s in [s for s in self.slices if s[1] in jornadas and (filtro is None or s[0] in filtro)]:
+            del self.slices[s]
+        nuevas = self.aggregate(data)
+        self.slices.update(nuevas)
+        return len(nuevas)
+
+    def add(self, data: VentasColumns) -> int:
+        """Suma líneas nuevas a sus porciones (servicio intradía). Devuelve porciones tocadas."""
+        nuevas = self.aggregate(data)
+        for s, cells in nuevas.items():
+            actual = self.slices.setdefault(s, {})
+            for k, (extra, medidas) in cells.items():
+                if k in actual:
+                    medidas = [a + b for a, b in zip(actual[k][1], medidas)]
+                actual[k] = (extra, medidas)
+        return len(nuevas)
+
+    def iter_rows(self, desde: Optional[date] = None, hasta: Optional[date] = None):
+        """Filas [clave..., descriptivos..., medidas...] en orden tienda/fecha/clave."""
+        for s in sorted(self.slices, key=_slice_order):
+            if desde or hasta:
+                d = parse_d(s[1])
+                if d is None or (desde and d < desde) or (hasta and d > hasta):
+                    continue
+            cells = self.slices[s]
+            for k in sorted(cells):
+                extra, medidas = cells[k]
+                yield [s[0], s[1], *k, *extra, *medidas]
+
+    # --- persistencia ---
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.header)
+            writer.writerows(self.iter_rows())
+        os.replace(tmp, path)  # escritura atómica
+
+    @classmethod
+    def load(cls, path: str, level: str) -> "RollupCube":
+        cube = cls(level)
+        if not os.path.exists(path):
+            return cube
+        nb, nk = len(cube.by), len(cube.by) + len(cube.extra)
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if header != cube.header:
+                raise SystemExit(f"Cabecera inesperada en {path}; borra el fichero para reconstruirlo.")
+            for row in reader:
+                cells = cube.slices.setdefault((row[0], row[1]), {})
+                cells[tuple(row[2:nb])] = (tuple(row[nb:nk]), [float(x) for x in row[nk:]])
+        return cube
+
+    # --- lectura para informes ---
+    def summary_table(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> List[List[Any]]:
+        """Misma tabla que daily_summary.summarize(), calculada desde el cubo."""
+        nk = len(self.by) + len(self.extra)
+        claves: List[List[Any]] = []
+        cols: List[List[float]] = [[] for _ in MEASURES]
+        for row in self.iter_rows(desde, hasta):
+            claves.append(row[:nk])
+            for i, x in enumerate(row[nk:]):
+                cols[i].append(x)
+        m = {c: np.asarray(col, dtype=np.float64) for c, col in zip(MEASURES, cols)}
+        return build_table(list(self.by) + list(self.extra), claves, metrics_from_measures(m))
+
+# ---------- API del pipeline ----------
+def load_cubes(out_dir: str, levels: Sequence[str] = tuple(LEVELS)) -> Dict[str, RollupCube]:
+    return {level: RollupCube.load(rollup_path(out_dir, level), level) for level in levels}
+
+def save_cubes(out_dir: str, cubes: Dict[str, RollupCube]):
+    os.makedirs(out_dir, exist_ok=True)
+    for level, cube in cubes.items():
+        cube.save(rollup_path(out_dir, level))
+
+def update_rollups(rows: List[dict], out_dir: str, jornadas: Iterable[str],
+                   tiendas: Optional[Sequence[int]] = None) -> Dict[str, RollupCube]:
+    """Tras una descarga: reemplaza en cada cubo las porciones de los días pedidos."""
+    start_time = time.time()
+    data = columns_from_rows(rows)
+    jornadas = list(jornadas)
+    cubes = load_cubes(out_dir)
+    for cube in cubes.values():
+        cube.replace_days(data, jornadas, tiendas)
+    save_cubes(out_dir, cubes)
+    tamanos = ", ".join(f"{lvl} {len(c)}" for lvl, c in cubes.items())
+    print(f"🧊 Cubos actualizados ({len(jornadas)} días) en {time.time() - start_time:.2f}s: {tamanos} filas")
+    return cubes
+
+def add_to_rollups(rows: List[dict], out_dir: str) -> Dict[str, RollupCube]:
+    """Servicio intradía: suma las líneas nuevas a la porción de su día."""
+    data = columns_from_rows(rows)
+    cubes = load_cubes(out_dir)
+    for cube in cubes.values():
+        cube.add(data)
+    save_cubes(out_dir, cubes)
+    return cubes
+
+def summary_tables(out_dir: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                   levels: Sequence[str] = tuple(LEVELS)) -> Optional[Dict[str, List[List[Any]]]]:
+    """Tablas de resumen desde los cubos, o None si aún no existen."""
+    if not all(os.path.exists(rollup_path(out_dir, lvl)) for lvl in levels):
+        return None
+    return {lvl: cube.summary_table(desde, hasta) for lvl, cube in load_cubes(out_dir, levels).items()}
+
+def main():
+    ap = argparse.ArgumentParser(description="Cubos de ventas pre-agregados por tienda/día/grupo/producto.")
+    ap.add_argument("csv", nargs="?", help="Reconstruye los días de este ventas_*.csv en los cubos")
+    ap.add_argument("--dir", default=OUTPUT_DIR, help="Directorio de los cubos (por defecto: OUTPUT_DIR)")
+    ap.add_argument("--nivel", choices=list(LEVELS), default="dia")
+    ap.add_argument("--desde", type=date.fromisoformat, help="YYYY-MM-DD")
+    ap.add_argument("--hasta", type=date.fromisoformat, help="YYYY-MM-DD")
+    args = ap.parse_args()
+
+    if args.csv:
+        start_time = time.time()
+        data = load_csv_columns(args.csv)
+        jornadas = set(data.keys[DATE_COL].tolist())
+        cubes = load_cubes(args.dir)
+        for cube in cubes.values():
+            cube.replace_days(data, jornadas)
+        save_cubes(args.dir, cubes)
+        print(f"🧊 {data.n} líneas → {len(jornadas)} días agregados en {time.time() - start_time:.2f}s",
+              file=sys.stderr)
+        return
+
+    cube = RollupCube.load(rollup_path(args.dir, args.nivel), args.nivel)
+    csv.writer(sys.stdout).writerows(cube.summary_table(args.desde, args.hasta))
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,6 @@
 import os
 import argparse
 from datetime import date
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 
 # Carga .env si existe (no falla si no está)
 try:
@@ -15,12 +12,17 @@ try:
 except Exception:
     pass
 
+# Las librerías de Google se importan al usarlas: arrancar el script (o
+# pedir --help) no carga googleapiclient.
 def build_drive(creds_json: str):
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
     scopes = ["https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_file(creds_json, scopes=scopes)
     return build("drive", "v3", credentials=creds)
 
 def upload_excel(drive, filepath: str, dest_name: str = None, folder_id: str = None, replace: bool = False):
+    from googleapiclient.http import MediaFileUpload
     if not dest_name:
         dest_name = os.path.basename(filepath)
 
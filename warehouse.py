@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# warehouse.py
+"""
+Almacén local SQLite de ventas, alimentado con la salida de make_rows_from_doc.
+
+Tablas:
+  ventas  -> una fila por línea de producto (mismas columnas que el CSV),
+             con índice por (TIENDA, JORNADA, PRODUCTO)
+  tiendas -> maestro de tiendas (MPTiendas)
+  costes  -> historial de costes unitarios por (tienda, referencia, fecha)
+
+Las cargas son idempotentes: dentro de una única transacción se borran los
+días descargados (y cada (TIENDA, JORNADA) recibido) y se vuelven a insertar.
+
+Uso:
+  python3 warehouse.py load ventas_2025-08-20.csv
+  python3 warehouse.py export --dia 2025-08-20          # CSV mes-a-fecha como fetch_today
+  python3 warehouse.py export --desde 2025-07-01 --hasta 2025-08-20 --out julio_agosto.csv
+"""
+
+import argparse, csv, os, sqlite3, time
+from datetime import date, datetime
+from typing import Dict, Any, List, Iterable, Optional, Sequence, Tuple
+
+from config import CSV_COLUMNS, OUTPUT_DIR, SQLITE_DB
+from excel_writer import DATETIME_COL, DATE_COL, NUMERIC_COLUMNS, safe_float, parse_dt, parse_d
+from fetch_today import CostHistory, fmt_fecha, fmt_jornada, ts_to_dt
+from intermediates import ventas_path, open_text
+
+def _q(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+def _col_type(col: str) -> str:
+    if col == "TIENDA":
+        return "INTEGER"
+    if col in NUMERIC_COLUMNS:
+        return "REAL"
+    return "TEXT"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY,
+    {", ".join(f"{_q(c)} {_col_type(c)}" for c in CSV_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS ix_ventas_tienda_jornada_producto ON ventas (TIENDA, JORNADA, PRODUCTO);
+CREATE TABLE IF NOT EXISTS tiendas (
+    codigo INTEGER PRIMARY KEY,
+    nombre TEXT, grupo TEXT, social TEXT, nif TEXT
+);
+CREATE TABLE IF NOT EXISTS costes (
+    tienda INTEGER NOT NULL,
+    referencia TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    coste REAL NOT NULL,
+    PRIMARY KEY (tienda, referencia, fecha)
+) WITHOUT ROWID;
+"""
+
+_INSERT_VENTA = (
+    f"INSERT INTO ventas ({', '.join(_q(c) for c in CSV_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in CSV_COLUMNS)})"
+)
+
+# ---------- Conexión ----------
+def connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+# ---------- Conversión fila <-> registro ----------
+def _to_db(col: str, val: Any):
+    if val is None or val == "":
+        return None
+    if col == "TIENDA":
+        num = safe_float(val)
+        return int(num) if num is not None else None
+    if col in NUMERIC_COLUMNS:
+        return safe_float(val)
+    if col == DATETIME_COL:
+        dt = val if isinstance(val, datetime) else parse_dt(str(val))
+        return dt.isoformat(sep=" ", timespec="minutes") if dt else str(val)
+    if col == DATE_COL:
+        d = val if isinstance(val, date) else parse_d(str(val))
+        return d.isoformat() if d else str(val)
+    return str(val)
+
+def _from_db(col: str, val: Any):
+    if val is None:
+        return ""
+    if col == DATETIME_COL:
+        dt = parse_dt(val)
+        return fmt_fecha(dt) if dt else val
+    if col == DATE_COL:
+        d = parse_d(val)
+        return fmt_jornada(d) if d else val
+    return val
+
+# ---------- Escritura ----------
+def upsert_rows(conn: sqlite3.Connection, rows: List[Dict[str, Any]],
+                jornadas: Optional[Iterable[str]] = None,
+                tiendas: Optional[Sequence[int]] = None) -> int:
+    """
+    Sustituye, en una transacción, las líneas de los días descargados
+    (jornadas, de las tiendas pedidas o todas) y de cada (TIENDA, JORNADA)
+    presente en rows. Un día/tienda que ya no tiene ventas queda vacío, así
+    que repetir la carga del mismo rango deja la tabla igual.
+    """
+    records = [tuple(_to_db(c, r.get(c, "")) for c in CSV_COLUMNS) for r in rows]
+    i_tienda, i_jornada = CSV_COLUMNS.index("TIENDA"), CSV_COLUMNS.index(DATE_COL)
+    store_days = sorted({(rec[i_tienda], rec[i_jornada]) for rec in records}, key=str)
+    dias = sorted({_to_db(DATE_COL, j) for j in (jornadas or [])})
+
+    with conn:
+        if tiendas is None:
+            conn.executemany("DELETE FROM ventas WHERE JORNADA = ?", [(d,) for d in dias])
+        else:
+            conn.executemany("DELETE FROM ventas WHERE TIENDA = ? AND JORNADA = ?",
+                             [(int(t), d) for t in tiendas for d in dias])
+        conn.executemany("DELETE FROM ventas WHERE TIENDA IS ? AND JORNADA IS ?", store_days)
+        conn.executemany(_INSERT_VENTA, records)
+    return len(records)
+
+def upsert_tiendas(conn: sqlite3.Connection, tiendas: Dict[int, Dict[str, str]]):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO tiendas (codigo, nombre, grupo, social, nif) VALUES (?, ?, ?, ?, ?)",
+            [(code, t.get("nombre", ""), t.get("grupo", ""), t.get("social", ""), t.get("nif", ""))
+             for code, t in tiendas.items()],
+        )
+
+def upsert_costes(conn: sqlite3.Connection, cost_index: Dict[int, CostHistory]):
+    def _records():
+        for tid, hist in cost_index.items():
+            for ref in hist:
+                times, costs = hist.history(ref)
+                for ts, unit in zip(times, costs):
+                    yield tid, ref, ts_to_dt(ts).isoformat(sep=" "), unit
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO costes (tienda, referencia, fecha, coste) VALUES (?, ?, ?, ?)",
+            _records(),
+        )
+
+# ---------- Lectura / exportación ----------
+def last_costs(conn: sqlite3.Connection, before: date) -> Iterable[Tuple[int, str, datetime, float]]:
+    """Última compra anterior a `before` por (tienda, referencia): (tienda, referencia, fecha, coste)."""
+    # SQLite: con MAX() las columnas sin agregar salen de la fila del máximo
+    sql = ("SELECT tienda, referencia, MAX(fecha), coste FROM costes "
+           "WHERE fecha < ? GROUP BY tienda, referencia")
+    for tid, ref, fecha, coste in conn.execute(sql, (before.isoformat(),)):
+        yield tid, ref, datetime.fromisoformat(fecha), coste
+
+def iter_rows(conn: sqlite3.Connection, desde: Optional[date] = None, hasta: Optional[date] = None,
+              tiendas: Optional[List[int]] = None) -> Iterable[Dict[str, Any]]:
+    """Filas con el mismo formato que genera fetch_today (fechas d/m/aaaa)."""
+    where, params = [], []
+    if desde is not None:
+        where.append("JORNADA >= ?"); params.append(desde.isoformat())
+    if hasta is not None:
+        where.append("JORNADA <= ?"); params.append(hasta.isoformat())
+    if tiendas:
+        where.append(f"TIENDA IN ({', '.join('?' for _ in tiendas)})"); params.extend(tiendas)
+    sql = f"SELECT {', '.join(_q(c) for c in CSV_COLUMNS)} FROM ventas"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY JORNADA, TIENDA, id"
+    for rec in conn.execute(sql, params):
+        yield {c: _from_db(c, v) for c, v in zip(CSV_COLUMNS, rec)}
+
+def export_csv(conn: sqlite3.Connection, out_csv: str, desde: Optional[date] = None,
+               hasta: Optional[date] = None, tiendas: Optional[List[int]] = None) -> int:
+    n = 0
+    with open_text(out_csv, "w") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in iter_rows(conn, desde, hasta, tiendas):
+            writer.writerow(row)
+            n += 1
+    return n
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Almacén SQLite de ventas (carga y exportación a CSV).")
+    ap.add_argument("--db", default=SQLITE_DB or os.path.join(OUTPUT_DIR, "ventas.sqlite"),
+                    help="Ruta a la base SQLite (o DAILY_SQLITE_DB en .env)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ap_load = sub.add_parser("load", help="Carga uno o varios ventas_*.csv existentes")
+    ap_load.add_argument("csv", nargs="+")
+
+    ap_exp = sub.add_parser("export", help="Regenera un CSV con el layout de fetch_today")
+    ap_exp.add_argument("--dia", type=date.fromisoformat,
+                        help="Genera ventas_YYYY-MM-DD.csv del 1 del mes hasta ese día")
+    ap_exp.add_argument("--desde", type=date.fromisoformat)
+    ap_exp.add_argument("--hasta", type=date.fromisoformat)
+    ap_exp.add_argument("--tiendas", help="Lista de tiendas separadas por comas")
+    ap_exp.add_argument("--out", help="CSV de salida")
+    args = ap.parse_args()
+
+    conn = connect(args.db)
+
+    if args.cmd == "load":
+        for path in args.csv:
+            start_time = time.time()
+            with open_text(path) as f:
+                n = upsert_rows(conn, list(csv.DictReader(f)))
+            print(f"✅ {path}: {n} filas en {time.time() - start_time:.2f}s")
+        return
+
+    desde, hasta = args.desde, args.hasta
+    out_csv = args.out
+    if args.dia:
+        desde, hasta = date(args.dia.year, args.dia.month, 1), args.dia
+        out_csv = out_csv or ventas_path(OUTPUT_DIR, args.dia)
+    if not out_csv:
+        raise SystemExit("--out requerido (o --dia)")
+    tiendas = [int(x) for x in args.tiendas.split(",") if x.strip()] if args.tiendas else None
+
+    n = export_csv(conn, out_csv, desde, hasta, tiendas)
+    print(f"✅ CSV generado: {out_csv} ({n} filas)")
+
+if __name__ == "__main__":
+    main()